@@ -1,16 +1,26 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, send_file, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, send_file, Response, abort
 from database import Database
-from face_utils import FaceRecognition
+from face_utils import FaceRecognition, decode_image
+from attendance import daily_statistics, rebuild_summary
+from audit_log import AuditLog
+from camera import CameraBroadcaster
+from enrollment import bulk_enroll, start_bulk_enroll
+from events import EventBus
+from exports import csv_stream, file_stream, presensi_rows, write_xlsx
+from gallery import ENCODING_VERSION, pack_encoding
+from job_store import JobStore
+from report_cache import ReportCache
+from reports import REPORT_TYPES, ReportJobs, render_report
+from shared_gallery import SharedGallery
+from student_import import import_students, read_student_file, validate_students
+from workers import RecognitionPool
 import bcrypt
+import click
 import json
 from datetime import datetime, timedelta
-import pandas as pd
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
 import io
 import os
+import tempfile
 import cv2
 import face_recognition
 import numpy as np
@@ -22,9 +32,29 @@ app.config.from_object(Config)
 # Initialize database and face recognition
 db = Database()
 face_recog = FaceRecognition()
+if Config.SHARED_GALLERY:
+    face_recog.use_shared_gallery(SharedGallery(Config.GALLERY_SHM_NAME))
 
-# Global variable untuk menyimpan frame kamera
-camera = None
+# Log aktivitas ditulis per batch di thread latar, bukan di jalur request
+audit_log = AuditLog(db, batch_size=Config.AUDIT_LOG_BATCH_SIZE, flush_interval=Config.AUDIT_LOG_FLUSH_INTERVAL)
+
+# Pool proses untuk /api/recognize (0 = dikenali di thread request)
+recognition_pool = RecognitionPool(face_recog, Config.RECOGNITION_WORKERS) if Config.RECOGNITION_WORKERS > 0 else None
+
+# Event presensi untuk klien SSE
+attendance_events = EventBus(max_queue=Config.SSE_QUEUE_SIZE)
+
+# Status enrollment massal di direktori bersama, terbaca dari semua worker
+enrollment_jobs = JobStore(Config.ENROLLMENT_JOB_DIR, ttl=Config.ENROLLMENT_JOB_TTL)
+
+# Laporan PDF dirender di proses terpisah
+report_jobs = ReportJobs(workers=Config.REPORT_WORKERS, ttl=Config.REPORT_TTL)
+
+# Cache laporan/export; hari yang sudah lewat tidak pernah kedaluwarsa
+report_cache = ReportCache(max_bytes=Config.REPORT_CACHE_MAX_BYTES, directory=Config.REPORT_CACHE_DIR,
+                           open_ttl=Config.REPORT_CACHE_OPEN_TTL)
+
+# Global variable untuk sampel wajah
 face_samples = []
 current_mahasiswa_id = None
 
@@ -47,6 +77,14 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def day_range(tanggal):
+    """Rentang setengah terbuka [tanggal, tanggal + 1 hari) agar query bisa memakai index waktu"""
+    try:
+        start = datetime.strptime(tanggal, '%Y-%m-%d')
+    except ValueError:
+        abort(400, description='Format tanggal harus YYYY-MM-DD')
+    return start, start + timedelta(days=1)
+
 @app.route('/')
 def index():
     if 'user_id' in session:
@@ -69,10 +107,7 @@ def login():
             session['role'] = user[0]['role']
             
             # Log activity
-            db.execute_insert(
-                "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-                (user[0]['id'], f"User {username} logged in")
-            )
+            audit_log.log(user[0]['id'], f"User {username} logged in")
             
             flash('Login berhasil!', 'success')
             return redirect(url_for('dashboard'))
@@ -85,10 +120,7 @@ def login():
 def logout():
     if 'user_id' in session:
         # Log activity
-        db.execute_insert(
-            "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-            (session['user_id'], f"User {session['username']} logged out")
-        )
+        audit_log.log(session['user_id'], f"User {session['username']} logged out")
     
     session.clear()
     flash('Anda telah logout.', 'info')
@@ -99,11 +131,10 @@ def logout():
 def dashboard():
     # Get statistics
     total_mahasiswa = db.execute_query("SELECT COUNT(*) as count FROM mahasiswa")[0]['count']
-    total_presensi_hari_ini = db.execute_query(
-        "SELECT COUNT(*) as count FROM presensi WHERE DATE(waktu) = CURDATE()"
-    )[0]['count']
+    statistik_hari_ini = daily_statistics(db, datetime.now().date())
+    total_presensi_hari_ini = statistik_hari_ini['masuk'] + statistik_hari_ini['keluar']
     mahasiswa_dengan_wajah = db.execute_query(
-        "SELECT COUNT(*) as count FROM mahasiswa WHERE face_encoding IS NOT NULL"
+        "SELECT COUNT(*) as count FROM mahasiswa WHERE face_encoding_bin IS NOT NULL"
     )[0]['count']
     
     # Recent attendance
@@ -121,16 +152,86 @@ def dashboard():
                          mahasiswa_dengan_wajah=mahasiswa_dengan_wajah,
                          recent_presensi=recent_presensi)
 
+def mahasiswa_page(search='', jurusan='', after=None, before=None, limit=50):
+    """Satu halaman daftar mahasiswa dengan keyset pagination pada (nama, id).
+    
+    Hanya kolom ringan yang dibaca dan has_face dihitung oleh database, jadi
+    encoding wajah tidak pernah dimuat. Cursor adalah id baris batas halaman.
+    Mengembalikan (rows, next_cursor, prev_cursor).
+    """
+    conditions, params = [], []
+    if search:
+        pattern = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append("(nim LIKE %s OR nama LIKE %s)")
+        params += [pattern + '%', '%' + pattern + '%']
+    if jurusan:
+        conditions.append("jurusan = %s")
+        params.append(jurusan)
+    
+    backwards = before is not None
+    cursor_id = before if backwards else after
+    anchor = None
+    if cursor_id is not None:
+        anchor = db.execute_query("SELECT id, nama FROM mahasiswa WHERE id = %s", (cursor_id,))
+        anchor = anchor[0] if anchor else None
+    if anchor is None:
+        backwards = False
+    else:
+        op = '<' if backwards else '>'
+        conditions.append(f"(nama {op} %s OR (nama = %s AND id {op} %s))")
+        params += [anchor['nama'], anchor['nama'], anchor['id']]
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    order = 'DESC' if backwards else 'ASC'
+    rows = db.execute_query(f'''
+        SELECT id, nim, nama, jurusan, created_at, face_encoding_bin IS NOT NULL AS has_face
+        FROM mahasiswa {where}
+        ORDER BY nama {order}, id {order}
+        LIMIT %s
+    ''', (*params, limit + 1)) or []
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    for m in rows:
+        m['has_face'] = bool(m['has_face'])
+    
+    next_cursor = rows[-1]['id'] if rows and (has_more or backwards) else None
+    prev_cursor = rows[0]['id'] if rows and anchor is not None and (has_more or not backwards) else None
+    return rows, next_cursor, prev_cursor
+
+def mahasiswa_page_args():
+    search = request.args.get('q', '').strip()
+    jurusan = request.args.get('jurusan', '').strip()
+    after = request.args.get('after', type=int)
+    before = request.args.get('before', type=int)
+    limit = min(max(request.args.get('limit', Config.MAHASISWA_PAGE_SIZE, type=int), 1), 200)
+    return search, jurusan, after, before, limit
+
 @app.route('/mahasiswa')
 @login_required
 def mahasiswa():
-    mahasiswa_list = db.execute_query("SELECT * FROM mahasiswa ORDER BY nama")
+    search, jurusan, after, before, limit = mahasiswa_page_args()
+    mahasiswa_list, next_cursor, prev_cursor = mahasiswa_page(search, jurusan, after, before, limit)
     
-    # Add face status
-    for m in mahasiswa_list:
-        m['has_face'] = m['face_encoding'] is not None
+    # Daftar jurusan dari index (jurusan, nama), tanpa membaca seluruh tabel
+    jurusan_list = [row['jurusan'] for row in db.execute_query(
+        "SELECT DISTINCT jurusan FROM mahasiswa ORDER BY jurusan"
+    ) or []]
     
-    return render_template('mahasiswa.html', mahasiswa_list=mahasiswa_list)
+    return render_template('mahasiswa.html', mahasiswa_list=mahasiswa_list,
+                           next_cursor=next_cursor, prev_cursor=prev_cursor,
+                           q=search, jurusan=jurusan, jurusan_list=jurusan_list)
+
+@app.route('/api/mahasiswa')
+@login_required
+def api_mahasiswa():
+    """Daftar mahasiswa (JSON) dengan pencarian dan keyset pagination: ?q=&jurusan=&after=&limit="""
+    rows, next_cursor, prev_cursor = mahasiswa_page(*mahasiswa_page_args())
+    for m in rows:
+        m['created_at'] = m['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    return jsonify({'data': rows, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor})
 
 @app.route('/mahasiswa/tambah', methods=['GET', 'POST'])
 @login_required
@@ -147,11 +248,11 @@ def tambah_mahasiswa():
                 (nim, nama, jurusan)
             )
             
+            # Rekap per mahasiswa ikut berubah
+            report_cache.clear()
+            
             # Log activity
-            db.execute_insert(
-                "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-                (session['user_id'], f"Menambah mahasiswa: {nama} ({nim})")
-            )
+            audit_log.log(session['user_id'], f"Menambah mahasiswa: {nama} ({nim})")
             
             flash('Mahasiswa berhasil ditambahkan!', 'success')
             return redirect(url_for('mahasiswa'))
@@ -161,6 +262,35 @@ def tambah_mahasiswa():
     
     return render_template('tambah_mahasiswa.html')
 
+@app.route('/mahasiswa/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_mahasiswa():
+    """Import mahasiswa dari CSV/XLSX dengan upsert per chunk dan satu entri log"""
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if upload is None or not upload.filename:
+            flash('File belum dipilih', 'error')
+            return redirect(url_for('import_mahasiswa'))
+        
+        try:
+            rows, errors = validate_students(read_student_file(upload, upload.filename))
+            inserted, updated = import_students(db, rows)
+            report_cache.clear()
+            
+            audit_log.log(session['user_id'], f"Import mahasiswa dari {upload.filename}: "
+                                              f"{inserted} baru, {updated} diperbarui, {len(errors)} baris dilewati")
+            
+            flash(f'Import selesai: {inserted} mahasiswa baru, {updated} diperbarui', 'success')
+            return render_template('import_mahasiswa.html', result={
+                'inserted': inserted, 'updated': updated, 'errors': errors
+            })
+        
+        except Exception as e:
+            flash(f'Error: {str(e)}', 'error')
+    
+    return render_template('import_mahasiswa.html', result=None)
+
 @app.route('/mahasiswa/<int:id>/hapus')
 @login_required
 @admin_required
@@ -168,12 +298,15 @@ def hapus_mahasiswa(id):
     try:
         mahasiswa = db.execute_query("SELECT * FROM mahasiswa WHERE id = %s", (id,))[0]
         db.execute_update("DELETE FROM mahasiswa WHERE id = %s", (id,))
+        if face_recog.shared is not None:
+            # Publish generation baru ke semua proses
+            face_recog.sync_from_db(db)
+        else:
+            face_recog.remove_face(id)
+        report_cache.clear()
         
         # Log activity
-        db.execute_insert(
-            "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-            (session['user_id'], f"Menghapus mahasiswa: {mahasiswa['nama']} ({mahasiswa['nim']})")
-        )
+        audit_log.log(session['user_id'], f"Menghapus mahasiswa: {mahasiswa['nama']} ({mahasiswa['nim']})")
         
         flash('Mahasiswa berhasil dihapus!', 'success')
     
@@ -186,15 +319,7 @@ def hapus_mahasiswa(id):
 @login_required
 @admin_required
 def daftar_wajah(id):
-    global face_samples, current_mahasiswa_id, camera
-    
-    # Reset dan tutup kamera yang mungkin masih terbuka
-    if camera is not None:
-        try:
-            camera.release()
-        except:
-            pass
-        camera = None
+    global face_samples, current_mahasiswa_id
     
     face_samples = []  # Reset samples
     current_mahasiswa_id = id
@@ -206,106 +331,45 @@ def daftar_wajah(id):
     
     return render_template('daftar_wajah.html', mahasiswa=mahasiswa[0])
 
+def detect_stream_faces(frame):
+    """Deteksi wajah untuk overlay stream (dijalankan di thread deteksi pipeline)"""
+    rgb_frame = np.ascontiguousarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    return face_recog.detect_faces(rgb_frame)
+
+def annotate_stream_frame(frame, face_locations):
+    """Menggambar hasil deteksi terakhir dan jumlah sampel pada frame stream"""
+    # Draw rectangles
+    for (top, right, bottom, left) in face_locations:
+        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 3)
+        cv2.putText(frame, 'Wajah Terdeteksi', (left, top - 10),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    
+    # Display sample count
+    cv2.putText(frame, f'Sampel: {len(face_samples)}/5', (10, 30),
+               cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+    
+    if len(face_locations) == 0:
+        cv2.putText(frame, 'Tidak ada wajah terdeteksi', (10, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
+    elif len(face_locations) > 1:
+        cv2.putText(frame, 'Terdeteksi > 1 wajah!', (10, 60),
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+
+# Satu kamera bersama untuk semua tab /video-feed dan capture_sample
+camera = CameraBroadcaster(0, detector=detect_stream_faces, annotate=annotate_stream_frame)
+
 def gen_frames():
-    """Generator untuk streaming video"""
-    global camera, face_samples
+    """Generator untuk streaming video dari kamera bersama.
     
+    Capture, deteksi dan encode berjalan di thread VideoPipeline masing-masing,
+    dan JPEG yang sama dibagikan ke semua klien tanpa encode ulang.
+    """
     try:
-        # Tutup kamera jika sudah terbuka
-        if camera is not None:
-            camera.release()
-        
-        # Buka kamera baru
-        camera = cv2.VideoCapture(0)
-        
-        if not camera.isOpened():
-            print("Error: Cannot open camera")
-            # Generate error frame
-            error_frame = np.zeros((480, 640, 3), dtype=np.uint8)
-            cv2.putText(error_frame, 'Camera Error', (200, 240),
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            ret, buffer = cv2.imencode('.jpg', error_frame)
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-            return
-        
-        # Set camera properties untuk memastikan format yang benar
-        camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-        camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-        camera.set(cv2.CAP_PROP_FPS, 30)
-        
-        # Warm up camera
-        for _ in range(5):
-            camera.read()
-        
-        while True:
-            success, frame = camera.read()
-            if not success:
-                print("Failed to read frame")
-                break
-            
-            try:
-                # Pastikan frame adalah BGR 8-bit
-                if len(frame.shape) == 2:  # Grayscale
-                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-                elif frame.shape[2] == 4:  # BGRA
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
-                
-                # Konversi ke uint8 jika belum
-                frame = frame.astype(np.uint8)
-                
-                # Pastikan contiguous
-                frame = np.ascontiguousarray(frame)
-                
-                # Detect faces untuk menampilkan rectangle
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                rgb_frame = np.ascontiguousarray(rgb_frame)
-                
-                face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-                
-                # Draw rectangles
-                for (top, right, bottom, left) in face_locations:
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 3)
-                    cv2.putText(frame, 'Wajah Terdeteksi', (left, top - 10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-                
-                # Display sample count
-                cv2.putText(frame, f'Sampel: {len(face_samples)}/5', (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                
-                if len(face_locations) == 0:
-                    cv2.putText(frame, 'Tidak ada wajah terdeteksi', (10, 60),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
-                elif len(face_locations) > 1:
-                    cv2.putText(frame, 'Terdeteksi > 1 wajah!', (10, 60),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                
-            except Exception as e:
-                print(f"Error processing frame: {e}")
-                import traceback
-                traceback.print_exc()
-                # Tampilkan error pada frame
-                cv2.putText(frame, f'Error: {str(e)[:40]}', (10, 30),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-            
-            # Encode frame
-            ret, buffer = cv2.imencode('.jpg', frame)
-            if not ret:
-                print("Failed to encode frame")
-                break
-                
-            frame_bytes = buffer.tobytes()
-            
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-                   
+        yield from camera.stream()
     except Exception as e:
         print(f"Error in gen_frames: {e}")
         import traceback
         traceback.print_exc()
-    finally:
-        if camera is not None:
-            camera.release()
 
 @app.route('/video-feed')
 @login_required
@@ -318,11 +382,11 @@ def video_feed():
 @login_required
 @admin_required
 def capture_sample():
-    """Capture satu sampel wajah"""
-    global camera, face_samples
+    """Capture satu sampel wajah dari buffer frame terbaru kamera bersama"""
+    global face_samples
     
     try:
-        if camera is None or not camera.isOpened():
+        if not camera.isOpened():
             return jsonify({'success': False, 'message': 'Kamera tidak tersedia'})
         
         success, frame = camera.read()
@@ -344,8 +408,8 @@ def capture_sample():
         # Pastikan rgb_frame adalah contiguous array
         rgb_frame = np.ascontiguousarray(rgb_frame)
         
-        # Find faces dengan model yang lebih cepat
-        face_locations = face_recognition.face_locations(rgb_frame, model="hog", number_of_times_to_upsample=1)
+        # Find faces pada frame yang diperkecil (FACE_DETECTION_SCALE)
+        face_locations = face_recog.detect_faces(rgb_frame)
         
         if len(face_locations) == 0:
             return jsonify({'success': False, 'message': 'Wajah tidak terdeteksi! Pastikan wajah terlihat jelas.'})
@@ -379,7 +443,7 @@ def capture_sample():
 @admin_required
 def save_face(id):
     """Simpan face encoding ke database"""
-    global face_samples, camera
+    global face_samples
     
     try:
         if len(face_samples) < 5:
@@ -387,32 +451,27 @@ def save_face(id):
         
         # Calculate average encoding
         avg_encoding = np.mean(face_samples, axis=0)
-        encoding_list = avg_encoding.tolist()
         
-        # Save to database
+        # Save to database (BLOB biner 512 byte)
         db.execute_update(
-            "UPDATE mahasiswa SET face_encoding = %s WHERE id = %s",
-            (json.dumps(encoding_list), id)
+            "UPDATE mahasiswa SET face_encoding_bin = %s, face_encoding_version = %s, face_encoding = NULL WHERE id = %s",
+            (pack_encoding(avg_encoding), ENCODING_VERSION, id)
         )
         
         # Log activity
         mahasiswa = db.execute_query("SELECT * FROM mahasiswa WHERE id = %s", (id,))[0]
-        db.execute_insert(
-            "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-            (session['user_id'], f"Mendaftarkan wajah: {mahasiswa['nama']} ({mahasiswa['nim']})")
-        )
+        audit_log.log(session['user_id'], f"Mendaftarkan wajah: {mahasiswa['nama']} ({mahasiswa['nim']})")
         
-        # Reload face encodings
-        face_recog.load_face_encodings_from_db(db)
+        # Update galeri untuk mahasiswa ini saja
+        if face_recog.shared is not None:
+            # Publish generation baru ke semua proses
+            face_recog.sync_from_db(db)
+        else:
+            face_recog.update_face(id, mahasiswa['nim'], mahasiswa['nama'], avg_encoding)
         
-        # Reset samples
+        # Reset samples (kamera bersama ditutup otomatis saat klien terakhir pergi)
         face_samples = []
         
-        # Release camera
-        if camera is not None:
-            camera.release()
-            camera = None
-        
         return jsonify({'success': True, 'message': 'Wajah berhasil didaftarkan!'})
         
     except Exception as e:
@@ -422,21 +481,60 @@ def save_face(id):
 @login_required
 @admin_required
 def cancel_capture(id):
-    """Cancel face capture and release camera"""
-    global camera, face_samples
+    """Cancel face capture"""
+    global face_samples
     
     face_samples = []
-    if camera is not None:
-        camera.release()
-        camera = None
     
     return redirect(url_for('mahasiswa'))
 
+@app.route('/api/enroll-bulk', methods=['POST'])
+@login_required
+@admin_required
+def api_enroll_bulk():
+    """Enrollment wajah massal dari ZIP foto bernama NIM, diproses di latar belakang"""
+    archive = request.files.get('archive')
+    if archive is None or not archive.filename:
+        return jsonify({'success': False, 'message': 'File ZIP foto belum dipilih'}), 400
+    
+    # ZIP disimpan ke disk agar foto dibaca satu per satu, tidak dimuat seluruhnya ke memori
+    fd, path = tempfile.mkstemp(suffix='.zip')
+    os.close(fd)
+    archive.save(path)
+    user_id = session['user_id']
+    
+    def on_done(report):
+        try:
+            face_recog.sync_from_db(db)
+        except Exception as e:
+            print(f"Error syncing gallery after bulk enrollment: {e}")
+        finally:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error removing enrollment upload {path}: {e}")
+        audit_log.log(user_id, f"Enrollment massal: {report.enrolled} wajah terdaftar, {len(report.failures)} gagal")
+    
+    enrollment_jobs.cleanup()
+    report = start_bulk_enroll(db, path, on_done=on_done, store=enrollment_jobs)
+    return jsonify({'success': True, 'job': report.id,
+                    'status_url': url_for('api_enroll_bulk_status', job_id=report.id)})
+
+@app.route('/api/enroll-bulk/<job_id>')
+@login_required
+@admin_required
+def api_enroll_bulk_status(job_id):
+    """Progres dan daftar kegagalan enrollment massal"""
+    report = enrollment_jobs.read(job_id)
+    if report is None:
+        abort(404)
+    return jsonify(report)
+
 @app.route('/presensi')
 @login_required
 def presensi():
-    # Load face encodings before starting
-    face_recog.load_face_encodings_from_db(db)
+    # Ambil hanya perubahan sejak pemuatan terakhir
+    face_recog.sync_from_db(db)
     return render_template('presensi.html')
 
 @app.route('/api/start-presensi')
@@ -445,127 +543,321 @@ def api_start_presensi():
     def attendance_callback(nim, nama, tipe, confidence):
         # This function will be called when attendance is recorded
         print(f"Presensi {tipe} untuk {nama} ({nim}) - Confidence: {confidence}")
+        
+        # Laporan yang mencakup hari ini sudah basi
+        report_cache.invalidate_open()
+        
+        # Kirim ke semua browser yang terhubung ke /api/events
+        attendance_events.publish('presensi', {
+            'nim': nim,
+            'nama': nama,
+            'tipe': tipe,
+            'confidence': round(float(confidence), 4),
+            'waktu': datetime.now().strftime('%H:%M:%S')
+        })
     
-    face_recog.run_attendance(db, callback=attendance_callback)
+    if not face_recog.run_attendance(db, callback=attendance_callback):
+        return jsonify({'success': False,
+                        'message': 'Presensi sudah berjalan di proses lain atau kamera tidak tersedia'}), 409
     return jsonify({'success': True})
 
-@app.route('/laporan')
+@app.route('/api/recognize', methods=['POST'])
 @login_required
-def laporan():
-    # Default: show today's attendance
+def api_recognize():
+    """Mengenali wajah pada frame JPEG yang dikirim kiosk/klien.
+    
+    Menerima satu gambar sebagai body (Content-Type: image/jpeg) atau beberapa
+    gambar multipart dengan field 'frames'. Tidak ada state per klien, jadi satu
+    server bisa melayani banyak kamera.
+    """
+    if request.files:
+        payloads = [f.read() for f in request.files.getlist('frames') or request.files.getlist('frame')]
+    else:
+        payloads = [request.get_data()]
+    
+    payloads = [p for p in payloads if p]
+    if not payloads:
+        return jsonify({'success': False, 'message': 'Tidak ada frame yang dikirim'}), 400
+    if len(payloads) > Config.RECOGNIZE_MAX_FRAMES:
+        return jsonify({'success': False,
+                        'message': f'Maksimal {Config.RECOGNIZE_MAX_FRAMES} frame per request'}), 400
+    
+    if recognition_pool is not None:
+        # Semua frame diproses paralel di proses worker
+        futures = [recognition_pool.submit(payload) for payload in payloads]
+        faces_per_frame = [future.result() for future in futures]
+    else:
+        faces_per_frame = []
+        for payload in payloads:
+            frame = decode_image(payload)
+            faces_per_frame.append(face_recog.recognize_faces(frame) if frame is not None else None)
+    
+    results = []
+    for index, faces in enumerate(faces_per_frame):
+        if faces is None:
+            results.append({'frame': index, 'error': 'Frame bukan gambar yang valid'})
+            continue
+        results.append({'frame': index, 'faces': faces})
+    
+    return jsonify({'success': True, 'results': results})
+
+@app.route('/api/statistics')
+@login_required
+def api_statistics():
+    """Statistik presensi harian dari tabel ringkasan presensi_harian"""
     tanggal = request.args.get('tanggal', datetime.now().strftime('%Y-%m-%d'))
-    
+    start, end = day_range(tanggal)
+    return jsonify(daily_statistics(db, start.date()))
+
+@app.route('/api/recent-attendance')
+@login_required
+def api_recent_attendance():
+    """Presensi terbaru hari ini (data awal sebelum event SSE masuk)"""
+    start, end = day_range(datetime.now().strftime('%Y-%m-%d'))
     presensi_data = db.execute_query('''
-        SELECT p.*, m.nim, m.nama, m.jurusan
+        SELECT m.nim, m.nama, p.tipe, p.waktu, p.confidence
         FROM presensi p 
         JOIN mahasiswa m ON p.mahasiswa_id = m.id 
-        WHERE DATE(p.waktu) = %s
-        ORDER BY p.waktu DESC
-    ''', (tanggal,))
+        WHERE p.waktu >= %s AND p.waktu < %s
+        ORDER BY p.waktu DESC 
+        LIMIT 10
+    ''', (start, end)) or []
+    
+    for p in presensi_data:
+        p['waktu'] = p['waktu'].strftime('%H:%M:%S')
     
-    return render_template('laporan.html', presensi_data=presensi_data, tanggal=tanggal)
+    return jsonify(presensi_data)
+
+@app.route('/api/events')
+@login_required
+def api_events():
+    """Server-Sent Events: presensi baru dikirim langsung ke browser"""
+    return Response(attendance_events.stream(),
+                   mimetype='text/event-stream',
+                   headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.cli.command('rebuild-summary')
+@click.option('--dari', type=click.DateTime(formats=['%Y-%m-%d']), help='Tanggal awal (YYYY-MM-DD)')
+@click.option('--sampai', type=click.DateTime(formats=['%Y-%m-%d']), help='Tanggal akhir (YYYY-MM-DD)')
+def rebuild_summary_command(dari, sampai):
+    """Menghitung ulang tabel ringkasan presensi_harian dari tabel presensi"""
+    with db.transaction() as cursor:
+        rows = rebuild_summary(cursor, dari.date() if dari else None, sampai.date() if sampai else None)
+    click.echo(f"Ringkasan harian dibangun ulang: {rows} baris")
+
+@app.cli.command('enroll-bulk')
+@click.argument('source', type=click.Path(exists=True))
+@click.option('--workers', type=int, default=None, help='Jumlah proses encoding (default: jumlah CPU)')
+@click.option('--batch-size', type=int, default=200, help='Jumlah UPDATE per transaksi')
+def enroll_bulk_command(source, workers, batch_size):
+    """Mendaftarkan wajah massal dari direktori atau ZIP foto bernama NIM"""
+    def progress(report):
+        if report.processed % 100 == 0:
+            click.echo(f"{report.processed} diproses, {report.enrolled} tersimpan, {len(report.failures)} gagal")
+    
+    report = bulk_enroll(db, source, workers=workers, batch_size=batch_size, progress=progress)
+    for failure in report.failures:
+        click.echo(f"Gagal {failure['nim']}: {failure['reason']}")
+    if report.error:
+        click.echo(f"Error: {report.error}")
+    click.echo(f"Selesai: {report.enrolled} wajah terdaftar, {len(report.failures)} gagal dari {report.total} NIM")
+    
+    # Publish ke galeri shared bila aktif; tanpa itu server mengambilnya saat sync berikutnya
+    if face_recog.shared is not None:
+        face_recog.sync_from_db(db)
+
+@app.route('/laporan')
+@login_required
+def laporan():
+    # Default: show today's attendance
+    tanggal = request.args.get('tanggal', datetime.now().strftime('%Y-%m-%d'))
+    start, end = day_range(tanggal)
+    
+    cache_key = report_cache.key('laporan', start, end)
+    cached = report_cache.get(cache_key)
+    if cached is not None:
+        presensi_data = json.loads(cached)
+        for row in presensi_data:
+            row['waktu'] = datetime.fromisoformat(row['waktu'])
+    else:
+        presensi_data = db.execute_query('''
+            SELECT p.*, m.nim, m.nama, m.jurusan
+            FROM presensi p 
+            JOIN mahasiswa m ON p.mahasiswa_id = m.id 
+            WHERE p.waktu >= %s AND p.waktu < %s
+            ORDER BY p.waktu DESC
+        ''', (start, end))
+        if presensi_data is not None:
+            # JSON (waktu sebagai string ISO), bukan pickle: file cache di disk tidak boleh bisa mengeksekusi kode
+            report_cache.put(cache_key, json.dumps(presensi_data, default=lambda v: v.isoformat()).encode('utf-8'), end)
+    
+    jurusan_list = [row['jurusan'] for row in db.execute_query(
+        "SELECT DISTINCT jurusan FROM mahasiswa ORDER BY jurusan"
+    ) or []]
+    
+    return render_template('laporan.html', presensi_data=presensi_data, tanggal=tanggal,
+                           jurusan_list=jurusan_list)
+
+def export_range_args():
+    """Rentang export dari dari=&sampai= (atau tanggal= untuk satu hari) dan filter jurusan="""
+    tanggal = request.values.get('tanggal', datetime.now().strftime('%Y-%m-%d'))
+    dari = request.values.get('dari') or tanggal
+    sampai = request.values.get('sampai') or dari
+    start, _ = day_range(dari)
+    _, end = day_range(sampai)
+    if end <= start:
+        abort(400, description='Tanggal akhir harus setelah tanggal awal')
+    
+    jurusan = request.values.get('jurusan', '').strip() or None
+    label = dari if dari == sampai else f"{dari}_{sampai}"
+    return start, end, jurusan, label
+
+def send_cached_file(path, mimetype, filename):
+    """Response untuk file di tier disk cache, atau None bila file sudah dihapus (mis. oleh clear())"""
+    try:
+        # Dibuka di sini agar file yang terhapus setelah dicek tidak menjadi error 500
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    return send_file(f, mimetype=mimetype, as_attachment=True, download_name=filename)
+
+def cached_download(cache_key, mimetype, filename):
+    """Response download dari cache laporan (file di disk atau data di memori), atau None"""
+    path = report_cache.path(cache_key)
+    if path is not None:
+        response = send_cached_file(path, mimetype, filename)
+        if response is not None:
+            return response
+    
+    data = report_cache.get(cache_key)
+    if data is not None:
+        return send_file(io.BytesIO(data), mimetype=mimetype, as_attachment=True, download_name=filename)
+    return None
 
 @app.route('/api/laporan/export-excel')
 @login_required
 def export_excel():
-    tanggal = request.args.get('tanggal', datetime.now().strftime('%Y-%m-%d'))
+    start, end, jurusan, label = export_range_args()
+    mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    filename = f'presensi_{label}.xlsx'
     
-    presensi_data = db.execute_query('''
-        SELECT m.nim, m.nama, m.jurusan, p.tipe, p.waktu, p.confidence
-        FROM presensi p 
-        JOIN mahasiswa m ON p.mahasiswa_id = m.id 
-        WHERE DATE(p.waktu) = %s
-        ORDER BY p.waktu
-    ''', (tanggal,))
-    
-    # Create DataFrame
-    df = pd.DataFrame(presensi_data)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name=f'Presensi_{tanggal}', index=False)
-    
-    output.seek(0)
+    # Log activity
+    audit_log.log(session['user_id'], f"Export Excel laporan presensi {label}" + (f" ({jurusan})" if jurusan else ""))
+    
+    cache_key = report_cache.key('excel', start, end, jurusan=jurusan)
+    cached = cached_download(cache_key, mimetype, filename)
+    if cached is not None:
+        return cached
+    
+    # Workbook write-only (memori konstan) ditulis ke file sementara
+    path = write_xlsx(presensi_rows(db, start, end, jurusan), sheet_name=f'Presensi_{label}')
+    cached_path = report_cache.put_file(cache_key, path, end)
+    if cached_path is not None:
+        response = send_cached_file(cached_path, mimetype, filename)
+        if response is not None:
+            return response
+        # Sudah terhapus oleh clear() di proses lain: buat ulang tanpa cache
+        path = write_xlsx(presensi_rows(db, start, end, jurusan), sheet_name=f'Presensi_{label}')
+    
+    # Tidak masuk tier disk: kirim per chunk lalu hapus file sementara
+    response = Response(file_stream(path), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['Content-Length'] = str(os.path.getsize(path))
+    return response
+
+@app.route('/api/laporan/export-csv')
+@login_required
+def export_csv():
+    """Export CSV yang di-stream langsung dari cursor database ke response"""
+    start, end, jurusan, label = export_range_args()
     
     # Log activity
-    db.execute_insert(
-        "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-        (session['user_id'], f"Export Excel laporan presensi tanggal {tanggal}")
-    )
+    audit_log.log(session['user_id'], f"Export CSV laporan presensi {label}" + (f" ({jurusan})" if jurusan else ""))
     
-    return send_file(output, 
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name=f'presensi_{tanggal}.xlsx')
+    response = Response(csv_stream(presensi_rows(db, start, end, jurusan)), mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename=presensi_{label}.csv'
+    return response
 
 @app.route('/api/laporan/export-pdf')
 @login_required
 def export_pdf():
-    tanggal = request.args.get('tanggal', datetime.now().strftime('%Y-%m-%d'))
+    """Laporan detail satu hari, dirender langsung; rentang panjang/rekap lewat /api/reports"""
+    start, end, jurusan, label = export_range_args()
+    if end - start > timedelta(days=1):
+        abort(400, description='Export PDF langsung hanya untuk satu hari; gunakan POST /api/reports untuk rentang tanggal')
+    filename = f'presensi_{label}.pdf'
     
-    presensi_data = db.execute_query('''
-        SELECT m.nim, m.nama, m.jurusan, p.tipe, p.waktu, p.confidence
-        FROM presensi p 
-        JOIN mahasiswa m ON p.mahasiswa_id = m.id 
-        WHERE DATE(p.waktu) = %s
-        ORDER BY p.waktu
-    ''', (tanggal,))
+    # Log activity
+    audit_log.log(session['user_id'], f"Export PDF laporan presensi tanggal {label}")
+    
+    cache_key = report_cache.key('pdf', start, end, jurusan=jurusan)
+    cached = cached_download(cache_key, 'application/pdf', filename)
+    if cached is not None:
+        return cached
     
-    # Create PDF
     buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    
-    # Title
-    styles = getSampleStyleSheet()
-    title = Paragraph(f"Laporan Presensi - {tanggal}", styles['Title'])
-    elements.append(title)
-    
-    # Table data
-    table_data = [['NIM', 'Nama', 'Jurusan', 'Tipe', 'Waktu', 'Confidence']]
-    
-    for presensi in presensi_data:
-        table_data.append([
-            presensi['nim'],
-            presensi['nama'],
-            presensi['jurusan'],
-            presensi['tipe'],
-            presensi['waktu'].strftime('%H:%M:%S'),
-            f"{presensi['confidence']:.2f}" if presensi['confidence'] else '-'
-        ])
-    
-    # Create table
-    table = Table(table_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    
-    elements.append(table)
-    
-    # Build PDF
-    doc.build(elements)
+    render_report(db, 'detail', start, end, jurusan, buffer)
+    report_cache.put(cache_key, buffer.getvalue(), end)
     buffer.seek(0)
     
-    # Log activity
-    db.execute_insert(
-        "INSERT INTO log (user_id, activity) VALUES (%s, %s)",
-        (session['user_id'], f"Export PDF laporan presensi tanggal {tanggal}")
-    )
-    
     return send_file(buffer, 
                     mimetype='application/pdf',
                     as_attachment=True,
-                    download_name=f'presensi_{tanggal}.pdf')
+                    download_name=filename)
+
+@app.route('/api/reports', methods=['POST'])
+@login_required
+def api_create_report():
+    """Memulai render laporan PDF di latar; hasilnya dipantau lewat status_url"""
+    report_type = request.values.get('type', 'detail')
+    if report_type not in REPORT_TYPES:
+        return jsonify({'success': False, 'message': 'Jenis laporan tidak dikenal'}), 400
+    
+    start, end, jurusan, label = export_range_args()
+    job = report_jobs.submit(report_type, start, end, jurusan)
+    
+    # Log activity
+    audit_log.log(session['user_id'], f"Membuat laporan PDF {report_type} {label}" + (f" ({jurusan})" if jurusan else ""))
+    
+    return jsonify({'success': True, 'job': job['id'],
+                    'status_url': url_for('api_report_status', job_id=job['id']),
+                    'download_url': url_for('api_report_download', job_id=job['id'])})
+
+@app.route('/api/reports/<job_id>')
+@login_required
+def api_report_status(job_id):
+    job = report_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': 'Laporan tidak ditemukan'}), 404
+    return jsonify(job)
+
+@app.route('/api/reports/<job_id>/download')
+@login_required
+def api_report_download(job_id):
+    job = report_jobs.get(job_id)
+    if job is None or job['status'] != 'done':
+        abort(404)
+    try:
+        # Dibuka di sini: file bisa saja baru dihapus cleanup di worker lain
+        f = open(report_jobs.path(job_id), 'rb')
+    except OSError:
+        abort(404)
+    return send_file(f, mimetype='application/pdf', as_attachment=True, download_name=job['filename'])
+
+def init_app():
+    """Memuat state awal proses: galeri wajah, presensi hari ini dan pool worker pengenalan.
+    
+    Dipanggil sekali per proses, oleh `python app.py` atau oleh wsgi.py
+    untuk server WSGI multi-worker.
+    """
+    # Load initial face encodings (snapshot di disk + perubahan dari database);
+    # dengan galeri shared, galeri dipublish/dipetakan di sini
+    face_recog.load_gallery(db)
+    # Presensi terakhir hari ini per mahasiswa (cooldown tanpa query)
+    face_recog.attendance.warm_up(db)
+    if recognition_pool is not None:
+        recognition_pool.warm_up()
 
 if __name__ == '__main__':
-    # Load initial face encodings
-    face_recog.load_face_encodings_from_db(db)
+    init_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,229 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Tabel ringkasan presensi per hari per jurusan, diperbarui setiap presensi dicatat
+SUMMARY_TABLE = '''
+    CREATE TABLE IF NOT EXISTS presensi_harian (
+        tanggal DATE NOT NULL,
+        jurusan VARCHAR(50) NOT NULL,
+        masuk INT NOT NULL DEFAULT 0,
+        keluar INT NOT NULL DEFAULT 0,
+        mahasiswa_unik INT NOT NULL DEFAULT 0,
+        first_in DATETIME,
+        last_out DATETIME,
+        PRIMARY KEY (tanggal, jurusan)
+    )
+'''
+
+_SUMMARY_UPSERT = '''
+    INSERT INTO presensi_harian (tanggal, jurusan, masuk, keluar, mahasiswa_unik, first_in, last_out)
+    SELECT %s, m.jurusan, %s, %s, %s, %s, %s FROM mahasiswa m WHERE m.id = %s
+    ON DUPLICATE KEY UPDATE
+        masuk = masuk + VALUES(masuk),
+        keluar = keluar + VALUES(keluar),
+        mahasiswa_unik = mahasiswa_unik + VALUES(mahasiswa_unik),
+        first_in = COALESCE(LEAST(first_in, VALUES(first_in)), first_in, VALUES(first_in)),
+        last_out = COALESCE(GREATEST(last_out, VALUES(last_out)), last_out, VALUES(last_out))
+'''
+
+
+def record_presensi(db, mahasiswa_id, tipe, confidence, waktu=None, first_today=None):
+    """Mencatat presensi dan memperbarui ringkasan harian dalam satu transaksi.
+
+    first_today menandakan presensi pertama mahasiswa hari ini (untuk hitungan
+    mahasiswa unik). Bila None, dicek lewat index (mahasiswa_id, waktu).
+    """
+    waktu = waktu or datetime.now()
+    day_start = waktu.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    with db.transaction() as cursor:
+        if first_today is None:
+            cursor.execute(
+                "SELECT 1 FROM presensi WHERE mahasiswa_id = %s AND waktu >= %s AND waktu < %s LIMIT 1",
+                (mahasiswa_id, day_start, waktu)
+            )
+            first_today = cursor.fetchone() is None
+
+        cursor.execute(
+            "INSERT INTO presensi (mahasiswa_id, waktu, tipe, confidence) VALUES (%s, %s, %s, %s)",
+            (mahasiswa_id, waktu, tipe, confidence)
+        )
+        presensi_id = cursor.lastrowid
+
+        cursor.execute(_SUMMARY_UPSERT, (
+            day_start.date(),
+            1 if tipe == 'masuk' else 0,
+            1 if tipe == 'keluar' else 0,
+            1 if first_today else 0,
+            waktu if tipe == 'masuk' else None,
+            waktu if tipe == 'keluar' else None,
+            mahasiswa_id
+        ))
+
+    return presensi_id
+
+
+class AttendanceState:
+    """Tipe dan waktu presensi terakhir hari ini per mahasiswa, disimpan di memori.
+
+    Dimuat dari database saat startup, saat run_attendance() mulai dan setiap
+    pergantian hari, lalu diperbarui setiap presensi dicatat, sehingga
+    penentuan masuk/keluar dan cooldown tidak perlu query. Hanya satu proses
+    yang mencatat presensi (lock presensi_recorder di run_attendance), jadi
+    selama loop presensi berjalan state ini selalu lengkap.
+    """
+
+    def __init__(self, retry_interval=30):
+        self._day = None  # hari yang sedang dilacak
+        self._loaded = False  # state _day sudah dimuat dari database
+        self._retry_at = 0.0
+        self._last = {}  # mahasiswa_id -> (tipe, waktu)
+        self._pending = {}  # mahasiswa_id -> entri sebelum claim() yang belum tersimpan
+        # Jeda (detik) sebelum memuat ulang bila database gagal, agar tidak query di setiap frame
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+
+    def _roll_over(self, day):
+        """Pindah ke hari baru (dipanggil dengan _lock dipegang); state lama dibuang"""
+        if self._day is None or day > self._day:
+            self._day = day
+            self._last = {}
+            self._pending = {}
+            self._loaded = False
+            self._retry_at = 0.0
+
+    def warm_up(self, db, now=None):
+        """Memuat presensi terakhir hari ini per mahasiswa dari database"""
+        day_start = (now or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = db.execute_query(
+            "SELECT mahasiswa_id, tipe, waktu FROM presensi WHERE waktu >= %s AND waktu < %s ORDER BY waktu",
+            (day_start, day_start + timedelta(days=1))
+        )
+
+        with self._lock:
+            self._roll_over(day_start.date())
+            if self._day != day_start.date():
+                return False
+            if rows is None:
+                # Database tidak tersedia; dicoba lagi setelah retry_interval
+                self._retry_at = time.monotonic() + self.retry_interval
+                return False
+
+            last = {row['mahasiswa_id']: (row['tipe'], row['waktu']) for row in rows}
+            # Presensi yang dicatat proses ini selama memuat tetap dipakai bila lebih baru
+            for mahasiswa_id, entry in self._last.items():
+                if mahasiswa_id not in last or last[mahasiswa_id][1] < entry[1]:
+                    last[mahasiswa_id] = entry
+            self._last = last
+            self._loaded = True
+        return True
+
+    def _current(self, db, now):
+        with self._lock:
+            self._roll_over(now.date())
+            load = not self._loaded and time.monotonic() >= self._retry_at
+            if load:
+                # Loop lain tidak ikut memuat selama pemuatan ini berjalan
+                self._retry_at = time.monotonic() + self.retry_interval
+        if load:
+            self.warm_up(db, now)
+        return self._last
+
+    def last(self, db, mahasiswa_id, now):
+        """(tipe, waktu) presensi terakhir hari ini, atau None"""
+        return self._current(db, now).get(mahasiswa_id)
+
+    def cooldown_remaining(self, db, mahasiswa_id, now, cooldown):
+        """Sisa detik cooldown sejak presensi terakhir (0 bila boleh presensi lagi)"""
+        last = self.last(db, mahasiswa_id, now)
+        if last is None:
+            return 0
+        return max(0.0, cooldown - (now - last[1]).total_seconds())
+
+    def claim(self, db, mahasiswa_id, now, cooldown):
+        """Cek cooldown dan tentukan presensi berikutnya secara atomik.
+
+        Mengembalikan (tipe, first_today), atau None bila masih cooldown atau
+        state hari ini belum bisa dimuat. Dua loop presensi yang menyimpan
+        mahasiswa yang sama bersamaan hanya satu yang lolos. Setelah menyimpan,
+        pemanggil wajib memanggil record() (berhasil) atau release() (gagal).
+        """
+        self._current(db, now)
+        with self._lock:
+            if self._day != now.date() or not self._loaded:
+                return None
+            last = self._last.get(mahasiswa_id)
+            if last is not None and (now - last[1]).total_seconds() < cooldown:
+                return None
+            tipe = 'keluar' if last and last[0] == 'masuk' else 'masuk'
+            self._pending[mahasiswa_id] = last
+            self._last[mahasiswa_id] = (tipe, now)
+            return tipe, last is None
+
+    def record(self, mahasiswa_id):
+        """Menandai presensi hasil claim() sudah tersimpan"""
+        with self._lock:
+            self._pending.pop(mahasiswa_id, None)
+
+    def release(self, mahasiswa_id):
+        """Mengembalikan entri sebelum claim() karena presensi gagal disimpan"""
+        with self._lock:
+            if mahasiswa_id not in self._pending:
+                return
+            previous = self._pending.pop(mahasiswa_id)
+            if previous is None:
+                self._last.pop(mahasiswa_id, None)
+            else:
+                self._last[mahasiswa_id] = previous
+
+
+def rebuild_summary(cursor, dari=None, sampai=None):
+    """Menghitung ulang presensi_harian dari tabel presensi (backfill), dari/sampai inklusif"""
+    start = datetime.combine(dari, datetime.min.time()) if dari else datetime(1000, 1, 1)
+    end = datetime.combine(sampai + timedelta(days=1), datetime.min.time()) if sampai else datetime(9999, 12, 31)
+
+    cursor.execute("DELETE FROM presensi_harian WHERE tanggal >= %s AND tanggal < %s", (start.date(), end.date()))
+    cursor.execute('''
+        INSERT INTO presensi_harian (tanggal, jurusan, masuk, keluar, mahasiswa_unik, first_in, last_out)
+        SELECT DATE(p.waktu), m.jurusan,
+               SUM(p.tipe = 'masuk'), SUM(p.tipe = 'keluar'), COUNT(DISTINCT p.mahasiswa_id),
+               MIN(CASE WHEN p.tipe = 'masuk' THEN p.waktu END),
+               MAX(CASE WHEN p.tipe = 'keluar' THEN p.waktu END)
+        FROM presensi p
+        JOIN mahasiswa m ON p.mahasiswa_id = m.id
+        WHERE p.waktu >= %s AND p.waktu < %s
+        GROUP BY DATE(p.waktu), m.jurusan
+    ''', (start, end))
+    return cursor.rowcount
+
+
+def daily_statistics(db, tanggal):
+    """Statistik presensi satu hari dari tabel ringkasan (tanpa scan tabel presensi)"""
+    rows = db.execute_query(
+        "SELECT jurusan, masuk, keluar, mahasiswa_unik, first_in, last_out "
+        "FROM presensi_harian WHERE tanggal = %s ORDER BY jurusan",
+        (tanggal,)
+    ) or []
+
+    first_in = [r['first_in'] for r in rows if r['first_in']]
+    last_out = [r['last_out'] for r in rows if r['last_out']]
+    return {
+        'tanggal': str(tanggal),
+        'masuk': sum(r['masuk'] for r in rows),
+        'keluar': sum(r['keluar'] for r in rows),
+        'mahasiswa_unik': sum(r['mahasiswa_unik'] for r in rows),
+        'first_in': min(first_in).strftime('%H:%M:%S') if first_in else None,
+        'last_out': max(last_out).strftime('%H:%M:%S') if last_out else None,
+        'per_jurusan': [
+            {
+                'jurusan': r['jurusan'],
+                'masuk': r['masuk'],
+                'keluar': r['keluar'],
+                'mahasiswa_unik': r['mahasiswa_unik'],
+                'first_in': r['first_in'].strftime('%H:%M:%S') if r['first_in'] else None,
+                'last_out': r['last_out'].strftime('%H:%M:%S') if r['last_out'] else None
+            }
+            for r in rows
+        ]
+    }
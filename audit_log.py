@@ -0,0 +1,122 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+_INSERT_LOG = "INSERT INTO log (user_id, activity, timestamp) VALUES (%s, %s, %s)"
+
+# Sinyal berhenti untuk thread penulis
+_STOP = object()
+
+
+class AuditLog:
+    """Penulis tabel log di thread latar.
+
+    Route hanya memasukkan aktivitas ke antrian; thread latar menulisnya
+    dengan executemany per batch, saat batch penuh atau setiap
+    flush_interval detik. Waktu dicatat saat aktivitas terjadi, bukan saat
+    ditulis. Bila antrian penuh, aktivitas baru dibuang (dicetak) agar request
+    tidak menunggu database. Sisa antrian ditulis saat proses berhenti.
+    """
+
+    def __init__(self, db, batch_size=100, flush_interval=1.0, max_queue=10000, retries=3):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def log(self, user_id, activity):
+        """Mencatat aktivitas tanpa menunggu database"""
+        record = (user_id, activity, datetime.now())
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            # Database tertinggal jauh atau mati; request tidak boleh ikut menunggu
+            print(f"Audit log queue full, dropped: [{record[2]}] user {user_id}: {activity}")
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            # Thread dibuat per proses (juga setelah fork oleh server WSGI)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audit-log', daemon=True)
+                self._thread.start()
+
+    def _write(self, batch):
+        if self.db.execute_many(_INSERT_LOG, batch) is not None:
+            return True
+
+        # Satu baris buruk (mis. user_id sudah dihapus) menggagalkan seluruh batch:
+        # tulis per baris agar hanya baris itu yang hilang
+        failed = batch
+        for attempt in range(self.retries):
+            remaining = [record for record in failed if self.db.execute_insert(_INSERT_LOG, record) is None]
+            if len(remaining) < len(failed):
+                # Database tersedia; sisa baris memang tidak bisa ditulis
+                failed = remaining
+                break
+            failed = remaining
+            if attempt < self.retries - 1:
+                time.sleep(min(2 ** attempt, 5))
+
+        for user_id, activity, timestamp in failed:
+            print(f"Audit log not written: [{timestamp}] user {user_id}: {activity}")
+        return not failed
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                record = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+
+            if record is _STOP:
+                if batch:
+                    self._write(batch)
+                return
+
+            if record is not None:
+                batch.append(record)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+                deadline = None
+
+    def close(self, timeout=10.0):
+        """Menulis semua aktivitas yang masih di antrian lalu menghentikan thread"""
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            try:
+                self._queue.put(_STOP, timeout=timeout)
+                thread.join(timeout)
+            except queue.Full:
+                pass
+            if thread.is_alive():
+                # Thread penulis macet (database mati); jangan gantung saat proses berhenti
+                print("Audit log writer not responding, remaining entries are not written")
+                return
+
+        # Aktivitas yang masuk setelah thread berhenti
+        remaining = []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not _STOP:
+                remaining.append(record)
+        if remaining:
+            self._write(remaining)
@@ -0,0 +1,288 @@
+"""Benchmark komponen sistem presensi.
+
+Contoh:
+    python benchmark.py index --size 50000 --nprobe 4 8 16 32
+    python benchmark.py detect-scale --video rekaman.mp4 --scales 1.0 0.5 0.25
+    python benchmark.py db-pool --pool-sizes 1 4 8 --threads 16
+    python benchmark.py date-range --rows 2000000
+    python benchmark.py workers --images frames/ --workers 1 2 4 8
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_index import IVFIndex
+from gallery import ENCODING_DIM, FaceGallery
+
+
+def synthetic_encodings(size, seed=0):
+    """Encoding sintetis yang meniru sebaran encoding dlib (jarak antar orang ~0.9)"""
+    rng = np.random.default_rng(seed)
+    groups = rng.normal(0, 0.06, (max(1, size // 500), ENCODING_DIM))
+    encodings = groups[rng.integers(0, len(groups), size)] + rng.normal(0, 0.045, (size, ENCODING_DIM))
+    return encodings.astype(np.float32)
+
+
+def bench_index(args):
+    """Membandingkan IVFIndex dengan linear scan: recall@1 dan latensi per query"""
+    encodings = synthetic_encodings(args.size, args.seed)
+    data = [{'id': i} for i in range(args.size)]
+
+    rng = np.random.default_rng(args.seed + 1)
+    targets = rng.integers(0, args.size, args.queries)
+    queries = encodings[targets] + rng.normal(0, 0.02, (args.queries, ENCODING_DIM)).astype(np.float32)
+
+    linear = FaceGallery(encodings, data)
+    start = time.perf_counter()
+    exact = np.array([linear.search(q, 1)[0][0, 0] for q in queries])
+    linear_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    print(f"Gallery: {args.size} encodings, {args.queries} queries")
+    print(f"{'index':<28}{'build (s)':>10}{'ms/query':>10}{'speedup':>9}{'recall@1':>10}")
+    print(f"{'linear':<28}{'-':>10}{linear_ms:>10.3f}{1.0:>9.1f}{1.0:>10.3f}")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        gallery = FaceGallery(encodings, data, index=IVFIndex(nlist=args.nlist, nprobe=nprobe, min_size=0))
+        build_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = np.array([gallery.search(q, 1)[0][0, 0] for q in queries])
+        ivf_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+        recall = float(np.mean(found == exact))
+        name = f"ivf nlist={len(gallery.index.centroids)} nprobe={nprobe}"
+        print(f"{name:<28}{build_s:>10.2f}{ivf_ms:>10.3f}{linear_ms / ivf_ms:>9.1f}{recall:>10.3f}")
+
+
+def read_frames(video, max_frames):
+    """Membaca frame BGR dari file video rekaman"""
+    import cv2
+
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+
+    if not frames:
+        raise SystemExit(f"Tidak ada frame yang bisa dibaca dari {video}")
+    return frames
+
+
+def bench_detect_scale(args):
+    """Frames/detik dan recall deteksi per skala, dibanding deteksi resolusi penuh"""
+    import cv2
+    from face_utils import detect_faces
+    from tracking import box_iou
+
+    frames = [cv2.cvtColor(f, cv2.COLOR_BGR2RGB) for f in read_frames(args.video, args.frames)]
+    reference = [detect_faces(f, 1.0) for f in frames]
+    total = sum(len(r) for r in reference)
+
+    height, width = frames[0].shape[:2]
+    print(f"Video: {args.video}, {len(frames)} frames {width}x{height}, {total} wajah (skala 1.0)")
+    print(f"{'scale':>6}{'fps':>9}{'ms/frame':>10}{'recall':>9}")
+
+    for scale in args.scales:
+        start = time.perf_counter()
+        detections = [detect_faces(f, scale) for f in frames]
+        elapsed = time.perf_counter() - start
+
+        # Wajah referensi dianggap terdeteksi bila ada kotak dengan IoU >= 0.5
+        found = sum(
+            any(box_iou(ref, box) >= args.iou for box in boxes)
+            for refs, boxes in zip(reference, detections) for ref in refs
+        )
+        recall = found / total if total else 0.0
+        print(f"{scale:>6.2f}{len(frames) / elapsed:>9.1f}{elapsed * 1000 / len(frames):>10.1f}{recall:>9.3f}")
+
+
+def bench_db_pool(args):
+    """Throughput query (request/detik) dari banyak thread dengan ukuran pool berbeda"""
+    from concurrent.futures import ThreadPoolExecutor
+    from database import Database
+
+    print(f"{args.threads} threads, {args.requests} requests: {args.query}")
+    print(f"{'pool':>6}{'req/s':>10}{'p95 ms':>9}{'errors':>8}")
+
+    for pool_size in args.pool_sizes:
+        db = Database(pool_size=pool_size)
+
+        def one_request(_):
+            start = time.perf_counter()
+            ok = db.execute_query(args.query) is not None
+            return ok, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            results = list(executor.map(one_request, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+        latencies = np.array([latency for _, latency in results]) * 1000
+        errors = sum(not ok for ok, _ in results)
+        print(f"{pool_size:>6}{args.requests / elapsed:>10.1f}{np.percentile(latencies, 95):>9.1f}{errors:>8}")
+
+
+def bench_date_range(args):
+    """Latensi query laporan harian: DATE(waktu) = hari vs rentang setengah terbuka, sebelum/sesudah index"""
+    import random
+    from datetime import datetime, timedelta
+    from database import Database
+
+    db = Database(pool_size=1)
+    table = 'bench_presensi'
+    day = datetime(2024, 3, 15)
+
+    queries = {
+        'DATE(waktu) = hari': (f"SELECT COUNT(*) FROM {table} WHERE DATE(waktu) = %s", (day.date(),)),
+        'waktu >= hari AND < hari+1': (f"SELECT COUNT(*) FROM {table} WHERE waktu >= %s AND waktu < %s",
+                                       (day, day + timedelta(days=1))),
+    }
+
+    def measure(cursor, label):
+        for name, (query, params) in queries.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                cursor.execute(query, params)
+                cursor.fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+            print(f"{label:<14}{name:<30}{np.median(timings):>10.1f}")
+
+    with db.connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute(f"""
+            CREATE TABLE {table} (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                mahasiswa_id INT NOT NULL,
+                waktu DATETIME NOT NULL,
+                tipe ENUM('masuk', 'keluar') NOT NULL,
+                confidence FLOAT
+            )
+        """)
+
+        # Seed awal lalu gandakan dengan INSERT ... SELECT sampai jumlah baris tercapai
+        rng = random.Random(args.seed)
+        seed_rows = [
+            (rng.randint(1, 20000), datetime(2023, 9, 1) + timedelta(seconds=rng.randint(0, 365 * 86400)),
+             rng.choice(['masuk', 'keluar']), rng.random())
+            for _ in range(10000)
+        ]
+        cursor.executemany(
+            f"INSERT INTO {table} (mahasiswa_id, waktu, tipe, confidence) VALUES (%s, %s, %s, %s)", seed_rows
+        )
+        total = len(seed_rows)
+        while total < args.rows:
+            cursor.execute(f"""
+                INSERT INTO {table} (mahasiswa_id, waktu, tipe, confidence)
+                SELECT mahasiswa_id, waktu + INTERVAL FLOOR(RAND() * 86400) SECOND, tipe, confidence
+                FROM {table} LIMIT %s
+            """, (args.rows - total,))
+            total += cursor.rowcount
+        connection.commit()
+
+        print(f"{total} rows, median of {args.repeat} runs")
+        print(f"{'':<14}{'query':<30}{'ms':>10}")
+        measure(cursor, 'tanpa index')
+        cursor.execute(f"CREATE INDEX idx_{table}_waktu ON {table} (waktu)")
+        measure(cursor, 'dengan index')
+
+        if not args.keep:
+            cursor.execute(f"DROP TABLE {table}")
+        cursor.close()
+
+
+def bench_workers(args):
+    """Frames/detik /api/recognize (decode + deteksi + encode + match) per jumlah proses worker"""
+    import glob
+    import os
+    from face_utils import FaceRecognition
+    from workers import RecognitionPool
+
+    paths = sorted(p for ext in ('*.jpg', '*.jpeg') for p in glob.glob(os.path.join(args.images, ext)))
+    if not paths:
+        raise SystemExit(f"Tidak ada file JPEG di {args.images}")
+    payloads = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            payloads.append(f.read())
+    payloads = (payloads * (args.frames // len(payloads) + 1))[:args.frames]
+
+    face_recog = FaceRecognition()
+    face_recog.gallery = FaceGallery(synthetic_encodings(args.gallery_size),
+                                     [{'id': i, 'nim': str(i), 'nama': f'Mahasiswa {i}'}
+                                      for i in range(args.gallery_size)])
+
+    print(f"{len(paths)} gambar, {len(payloads)} frame, galeri {args.gallery_size} wajah, {os.cpu_count()} CPU")
+    print(f"{'workers':>8}{'fps':>9}{'speedup':>9}")
+
+    baseline = None
+    for workers in args.workers:
+        pool = RecognitionPool(face_recog, workers)
+        pool.warm_up()
+        try:
+            start = time.perf_counter()
+            futures = [pool.submit(payload) for payload in payloads]
+            for future in futures:
+                future.result()
+            elapsed = time.perf_counter() - start
+        finally:
+            pool.shutdown()
+
+        fps = len(payloads) / elapsed
+        baseline = baseline or fps
+        print(f"{workers:>8}{fps:>9.1f}{fps / baseline:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help='IVF index vs linear scan')
+    index_parser.add_argument('--size', type=int, default=50000)
+    index_parser.add_argument('--queries', type=int, default=500)
+    index_parser.add_argument('--nlist', type=int, default=0)
+    index_parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    index_parser.add_argument('--seed', type=int, default=0)
+    index_parser.set_defaults(func=bench_index)
+
+    scale_parser = subparsers.add_parser('detect-scale', help='Kecepatan dan recall deteksi per skala')
+    scale_parser.add_argument('--video', required=True, help='File video rekaman kamera')
+    scale_parser.add_argument('--frames', type=int, default=300)
+    scale_parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.75, 0.5, 0.25])
+    scale_parser.add_argument('--iou', type=float, default=0.5)
+    scale_parser.set_defaults(func=bench_detect_scale)
+
+    pool_parser = subparsers.add_parser('db-pool', help='Load test pool koneksi database')
+    pool_parser.add_argument('--pool-sizes', type=int, nargs='+', default=[1, 4, 8])
+    pool_parser.add_argument('--threads', type=int, default=16)
+    pool_parser.add_argument('--requests', type=int, default=2000)
+    pool_parser.add_argument('--query', default='SELECT COUNT(*) AS count FROM presensi WHERE waktu >= CURDATE()')
+    pool_parser.set_defaults(func=bench_db_pool)
+
+    range_parser = subparsers.add_parser('date-range', help='Query laporan harian sebelum/sesudah index')
+    range_parser.add_argument('--rows', type=int, default=2000000)
+    range_parser.add_argument('--repeat', type=int, default=5)
+    range_parser.add_argument('--seed', type=int, default=0)
+    range_parser.add_argument('--keep', action='store_true', help='Jangan hapus tabel benchmark')
+    range_parser.set_defaults(func=bench_date_range)
+
+    workers_parser = subparsers.add_parser('workers', help='Throughput pool proses pengenalan wajah')
+    workers_parser.add_argument('--images', required=True, help='Direktori berisi frame JPEG')
+    workers_parser.add_argument('--frames', type=int, default=200)
+    workers_parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    workers_parser.add_argument('--gallery-size', type=int, default=1000)
+    workers_parser.set_defaults(func=bench_workers)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import threading
+import traceback
+
+import cv2
+import numpy as np
+
+
+def error_jpeg(message='Camera Error', width=640, height=480) -> bytes:
+    """Frame JPEG hitam berisi pesan error"""
+    error_frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.putText(error_frame, message, (200, height // 2),
+               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+    ret, buffer = cv2.imencode('.jpg', error_frame)
+    return buffer.tobytes()
+
+
+def mjpeg_chunk(jpeg: bytes) -> bytes:
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+
+class LatestFrame:
+    """Antrian berkapasitas satu: hanya item terbaru yang disimpan, item lama ditimpa"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._item = None
+        self._seq = 0
+
+    def put(self, item):
+        with self._condition:
+            self._item = item
+            self._seq += 1
+            self._condition.notify_all()
+
+    def peek(self):
+        with self._condition:
+            return self._seq, self._item
+
+    def get(self, last_seq=0, timeout=None):
+        """Menunggu item yang lebih baru dari last_seq, mengembalikan (seq, item) atau (last_seq, None) bila timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._seq != last_seq, timeout):
+                return last_seq, None
+            return self._seq, self._item
+
+
+class VideoPipeline:
+    """Pipeline kamera berthread: capture -> deteksi -> overlay + encode JPEG.
+
+    - Thread capture membaca kamera secepat mungkin dan hanya menyimpan frame terbaru.
+    - Thread deteksi mengambil frame terbaru dan berjalan pada kecepatannya sendiri.
+    - Thread encoder menggambar hasil deteksi terakhir pada setiap frame lalu
+      meng-encode JPEG, sehingga stream berjalan pada FPS kamera.
+    """
+
+    def __init__(self, source=0, detector=None, annotate=None, width=640, height=480, fps=30):
+        self.source = source
+        self.detector = detector
+        self.annotate = annotate
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+        self.frames = LatestFrame()
+        self.jpegs = LatestFrame()
+        self._detections = []
+        self._detections_lock = threading.Lock()
+
+        self._capture = None
+        self._running = threading.Event()
+        self._threads = []
+
+    def start(self) -> bool:
+        """Membuka kamera dan menjalankan thread pipeline"""
+        self._capture = cv2.VideoCapture(self.source)
+        if not self._capture.isOpened():
+            print("Error: Cannot open camera")
+            self._capture.release()
+            self._capture = None
+            return False
+
+        # Set camera properties untuk memastikan format yang benar
+        self._capture.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        self._capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        self._capture.set(cv2.CAP_PROP_FPS, self.fps)
+
+        # Warm up camera
+        for _ in range(5):
+            self._capture.read()
+
+        self._running.set()
+        targets = [self._capture_loop, self._encode_loop]
+        if self.detector is not None:
+            targets.append(self._detect_loop)
+        self._threads = [threading.Thread(target=target, daemon=True) for target in targets]
+        for thread in self._threads:
+            thread.start()
+        return True
+
+    def isOpened(self) -> bool:
+        return self._running.is_set()
+
+    def read(self):
+        """Frame terbaru dari kamera, dengan antarmuka seperti cv2.VideoCapture.read()"""
+        seq, frame = self.frames.peek()
+        if not self._running.is_set() or frame is None:
+            return False, None
+        return True, frame.copy()
+
+    @property
+    def detections(self):
+        with self._detections_lock:
+            return self._detections
+
+    def _capture_loop(self):
+        try:
+            while self._running.is_set():
+                success, frame = self._capture.read()
+                if not success:
+                    print("Failed to read frame")
+                    break
+
+                # Pastikan frame adalah BGR 8-bit dan contiguous
+                if len(frame.shape) == 2:  # Grayscale
+                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                elif frame.shape[2] == 4:  # BGRA
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR)
+                frame = np.ascontiguousarray(frame, dtype=np.uint8)
+
+                self.frames.put(frame)
+        finally:
+            self._running.clear()
+            self._capture.release()
+            # Bangunkan thread lain yang sedang menunggu frame
+            self.frames.put(None)
+
+    def _detect_loop(self):
+        seq = 0
+        while self._running.is_set():
+            seq, frame = self.frames.get(seq, timeout=1.0)
+            if frame is None:
+                continue
+            try:
+                detections = self.detector(frame)
+            except Exception as e:
+                print(f"Error detecting faces: {e}")
+                traceback.print_exc()
+                detections = []
+            with self._detections_lock:
+                self._detections = detections
+
+    def _encode_loop(self):
+        seq = 0
+        while self._running.is_set():
+            seq, frame = self.frames.get(seq, timeout=1.0)
+            if frame is None:
+                continue
+
+            # Overlay hasil deteksi terakhir pada salinan frame
+            frame = frame.copy()
+            if self.annotate is not None:
+                try:
+                    self.annotate(frame, self.detections)
+                except Exception as e:
+                    print(f"Error processing frame: {e}")
+                    cv2.putText(frame, f'Error: {str(e)[:40]}', (10, 30),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+
+            ret, buffer = cv2.imencode('.jpg', frame)
+            if not ret:
+                print("Failed to encode frame")
+                continue
+            self.jpegs.put(buffer.tobytes())
+
+    def mjpeg(self):
+        """Generator multipart MJPEG dari frame JPEG terbaru"""
+        seq = 0
+        while self._running.is_set():
+            seq, jpeg = self.jpegs.get(seq, timeout=1.0)
+            if jpeg is not None:
+                yield mjpeg_chunk(jpeg)
+
+    def release(self):
+        """Menghentikan pipeline dan menutup kamera"""
+        self._running.clear()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2.0)
+        self._threads = []
+
+
+class CameraBroadcaster:
+    """Satu kamera bersama untuk semua klien video feed.
+
+    Broadcaster memiliki satu VideoPipeline (satu cv2.VideoCapture). Setiap
+    frame di-encode JPEG satu kali dan byte yang sama dibagikan ke semua
+    subscriber. Subscriber yang lambat hanya melewatkan frame karena buffer
+    JPEG berkapasitas satu. Kamera dibuka saat subscriber pertama datang dan
+    ditutup saat subscriber terakhir pergi.
+    """
+
+    def __init__(self, source=0, detector=None, annotate=None, width=640, height=480, fps=30):
+        self._options = dict(source=source, detector=detector, annotate=annotate,
+                             width=width, height=height, fps=fps)
+        self._pipeline = None
+        self._subscribers = 0
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    def _acquire(self):
+        with self._lock:
+            if self._pipeline is None or not self._pipeline.isOpened():
+                pipeline = VideoPipeline(**self._options)
+                if not pipeline.start():
+                    return None
+                self._pipeline = pipeline
+            self._subscribers += 1
+            return self._pipeline
+
+    def _release(self, pipeline):
+        with self._lock:
+            self._subscribers -= 1
+            if self._subscribers > 0 or self._pipeline is not pipeline:
+                return
+            self._pipeline = None
+        pipeline.release()
+
+    def stream(self):
+        """Generator MJPEG untuk satu klien"""
+        pipeline = self._acquire()
+        if pipeline is None:
+            yield mjpeg_chunk(error_jpeg('Camera Error'))
+            return
+
+        try:
+            yield from pipeline.mjpeg()
+        finally:
+            self._release(pipeline)
+
+    def isOpened(self) -> bool:
+        pipeline = self._pipeline
+        return pipeline is not None and pipeline.isOpened()
+
+    def read(self):
+        """Frame terbaru dari buffer kamera bersama (tanpa membaca kamera lagi)"""
+        pipeline = self._pipeline
+        if pipeline is None:
+            return False, None
+        return pipeline.read()
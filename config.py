@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,8 +13,62 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'root')
     DB_PASSWORD = os.getenv('DB_PASSWORD', '')
     DB_NAME = os.getenv('DB_NAME', 'presensi_system')
+    DB_POOL_NAME = os.getenv('DB_POOL_NAME', 'presensi_pool')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))  # maksimal 32 (batas mysql.connector)
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
     
     # Face recognition settings
     FACE_RECOGNITION_THRESHOLD = float(os.getenv('FACE_RECOGNITION_THRESHOLD', '0.45'))
     FACE_SAMPLES = int(os.getenv('FACE_SAMPLES', '5'))
-    ATTENDANCE_COOLDOWN = int(os.getenv('ATTENDANCE_COOLDOWN', '5'))
\ No newline at end of file
+    ATTENDANCE_COOLDOWN = int(os.getenv('ATTENDANCE_COOLDOWN', '5'))
+    
+    # Jumlah mahasiswa per halaman di /mahasiswa dan /api/mahasiswa
+    MAHASISWA_PAGE_SIZE = int(os.getenv('MAHASISWA_PAGE_SIZE', '50'))
+    
+    # Log aktivitas: ditulis per batch saat jumlah tercapai atau setelah interval (detik)
+    AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', '100'))
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', '1.0'))
+    
+    # Render laporan PDF di latar: jumlah proses dan umur file hasil (detik)
+    REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', '2'))
+    REPORT_TTL = int(os.getenv('REPORT_TTL', '3600'))
+    
+    # Cache laporan/export: batas memori (byte), direktori tier disk (kosong = nonaktif),
+    # dan umur maksimal entri yang mencakup hari ini (detik)
+    REPORT_CACHE_MAX_BYTES = int(os.getenv('REPORT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    REPORT_CACHE_DIR = os.getenv('REPORT_CACHE_DIR', '')
+    REPORT_CACHE_OPEN_TTL = int(os.getenv('REPORT_CACHE_OPEN_TTL', '60'))
+    
+    # Jumlah frame maksimal per request /api/recognize
+    RECOGNIZE_MAX_FRAMES = int(os.getenv('RECOGNIZE_MAX_FRAMES', '8'))
+    
+    # Jumlah proses worker pengenalan untuk /api/recognize (0 = tanpa pool proses)
+    RECOGNITION_WORKERS = int(os.getenv('RECOGNITION_WORKERS', '0'))
+    
+    # Status enrollment massal: direktori bersama semua worker dan umurnya (detik)
+    ENROLLMENT_JOB_DIR = os.getenv('ENROLLMENT_JOB_DIR', os.path.join(tempfile.gettempdir(), 'presensi_enrollment'))
+    ENROLLMENT_JOB_TTL = int(os.getenv('ENROLLMENT_JOB_TTL', '3600'))
+    
+    # Kapasitas antrian event per klien SSE (/api/events)
+    SSE_QUEUE_SIZE = int(os.getenv('SSE_QUEUE_SIZE', '100'))
+    
+    # Deteksi wajah dilakukan pada frame yang diperkecil (1.0 = resolusi penuh)
+    FACE_DETECTION_SCALE = float(os.getenv('FACE_DETECTION_SCALE', '0.5'))
+    
+    # Pelacakan wajah: encoding hanya untuk wajah baru atau setiap N frame
+    FACE_TRACK_IOU = float(os.getenv('FACE_TRACK_IOU', '0.3'))
+    FACE_TRACK_REVERIFY_FRAMES = int(os.getenv('FACE_TRACK_REVERIFY_FRAMES', '15'))
+    FACE_TRACK_MAX_MISSES = int(os.getenv('FACE_TRACK_MAX_MISSES', '5'))
+    
+    # Galeri wajah di shared memory untuk server WSGI multi-proses
+    SHARED_GALLERY = os.getenv('SHARED_GALLERY', 'False').lower() == 'true'
+    GALLERY_SHM_NAME = os.getenv('GALLERY_SHM_NAME', 'presensi_gallery')
+    
+    # Snapshot galeri di disk (mmap) untuk startup cepat; kosong = nonaktif
+    GALLERY_SNAPSHOT_PATH = os.getenv('GALLERY_SNAPSHOT_PATH', 'gallery_snapshot')
+    
+    # Face index: 'linear' (exact) atau 'ivf' (approximate + rerank exact)
+    FACE_INDEX = os.getenv('FACE_INDEX', 'linear')
+    FACE_INDEX_NLIST = int(os.getenv('FACE_INDEX_NLIST', '0'))  # 0 = otomatis (4 * sqrt(N))
+    FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', '8'))
+    FACE_INDEX_MIN_SIZE = int(os.getenv('FACE_INDEX_MIN_SIZE', '1000'))
\ No newline at end of file
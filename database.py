@@ -1,126 +1,323 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from config import Config
+from attendance import SUMMARY_TABLE, rebuild_summary
+from gallery import ENCODING_VERSION, pack_encoding
+
+
+def ensure_column(cursor, table, column, definition):
+    """Menambahkan kolom ke tabel lama jika belum ada"""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def ensure_index(cursor, table, index, columns):
+    """Membuat index pada tabel lama jika belum ada"""
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+        (table, index)
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+
+
+def migrate_face_encodings(cursor):
+    """Mengonversi encoding JSON lama di kolom face_encoding ke format biner"""
+    cursor.execute(
+        "SELECT id, face_encoding FROM mahasiswa "
+        "WHERE face_encoding IS NOT NULL AND face_encoding_bin IS NULL"
+    )
+    
+    updates = []
+    for mahasiswa_id, face_encoding in cursor.fetchall():
+        try:
+            updates.append((pack_encoding(json.loads(face_encoding)), ENCODING_VERSION, mahasiswa_id))
+        except Exception as e:
+            print(f"Error migrating face encoding for mahasiswa {mahasiswa_id}: {e}")
+    
+    if updates:
+        cursor.executemany(
+            "UPDATE mahasiswa SET face_encoding_bin = %s, face_encoding_version = %s, "
+            "face_encoding = NULL WHERE id = %s",
+            updates
+        )
+        print(f"Migrated {len(updates)} face encodings to binary format")
+    
+    return len(updates)
 
 class Database:
-    def __init__(self):
+    def __init__(self, pool_size=None, init=True):
+        """init=False melewati pembuatan tabel dan migrasi (proses pembantu, skema sudah disiapkan aplikasi)"""
         config = Config()
         self.host = config.DB_HOST
         self.user = config.DB_USER
         self.password = config.DB_PASSWORD
         self.database = config.DB_NAME
-        self.connection = None
+        self.pool_name = config.DB_POOL_NAME
+        self.pool_size = pool_size or config.DB_POOL_SIZE
+        self.pool_timeout = config.DB_POOL_TIMEOUT
+        self.pool = None
+        # mysql.connector langsung error saat pool habis, semaphore membuat request menunggu
+        self._available = threading.BoundedSemaphore(self.pool_size)
+        self._pool_lock = threading.Lock()
         self.connect()
-        self.init_database()
+        if init:
+            self.init_database()
 
     def connect(self):
         try:
-            self.connection = mysql.connector.connect(
+            self.pool = pooling.MySQLConnectionPool(
+                pool_name=self.pool_name,
+                pool_size=self.pool_size,
+                pool_reset_session=True,
                 host=self.host,
                 user=self.user,
                 password=self.password,
                 database=self.database
             )
-            print("Database connected successfully")
+            print(f"Database connected successfully (pool size {self.pool_size})")
         except Error as e:
             print(f"Error connecting to database: {e}")
 
+    @contextmanager
+    def connection(self):
+        """Meminjam satu koneksi dari pool dan mengembalikannya setelah selesai"""
+        if self.pool is None:
+            # Database belum tersedia saat startup: coba buat pool lagi
+            with self._pool_lock:
+                if self.pool is None:
+                    self.connect()
+            if self.pool is None:
+                raise pooling.PoolError("Database connection pool is not available")
+        
+        if not self._available.acquire(timeout=self.pool_timeout):
+            raise pooling.PoolError("Timed out waiting for a database connection")
+        
+        try:
+            connection = self.pool.get_connection()
+            try:
+                # Health check; koneksi yang terputus dibuka ulang sekali. Tanpa retry/delay
+                # agar request gagal cepat saat MySQL tidak bisa dihubungi
+                connection.ping(reconnect=True, attempts=1, delay=0)
+                yield connection
+            finally:
+                # Mengembalikan koneksi ke pool
+                connection.close()
+        finally:
+            self._available.release()
+
     def init_database(self):
         try:
-            cursor = self.connection.cursor()
-            
-            # Create tables if not exists
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    username VARCHAR(50) UNIQUE NOT NULL,
-                    password VARCHAR(255) NOT NULL,
-                    role ENUM('admin', 'operator') NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS mahasiswa (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    nim VARCHAR(20) UNIQUE NOT NULL,
-                    nama VARCHAR(100) NOT NULL,
-                    jurusan VARCHAR(50) NOT NULL,
-                    face_encoding LONGTEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS presensi (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    mahasiswa_id INT NOT NULL,
-                    waktu DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    tipe ENUM('masuk', 'keluar') NOT NULL,
-                    confidence FLOAT,
-                    FOREIGN KEY (mahasiswa_id) REFERENCES mahasiswa(id)
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS log (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    activity TEXT NOT NULL,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id)
-                )
-            ''')
-            
-            # Insert default admin user if not exists
-            cursor.execute('SELECT COUNT(*) FROM users')
-            if cursor.fetchone()[0] == 0:
-                import bcrypt
-                hashed_password = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt())
-                cursor.execute(
-                    'INSERT INTO users (username, password, role) VALUES (%s, %s, %s)',
-                    ('admin', hashed_password.decode('utf-8'), 'admin')
-                )
-            
-            self.connection.commit()
-            cursor.close()
+            with self.connection() as connection:
+                cursor = connection.cursor()
+                
+                # Create tables if not exists
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        username VARCHAR(50) UNIQUE NOT NULL,
+                        password VARCHAR(255) NOT NULL,
+                        role ENUM('admin', 'operator') NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS mahasiswa (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        nim VARCHAR(20) UNIQUE NOT NULL,
+                        nama VARCHAR(100) NOT NULL,
+                        jurusan VARCHAR(50) NOT NULL,
+                        face_encoding LONGTEXT,
+                        face_encoding_bin VARBINARY(512),
+                        face_encoding_version TINYINT,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        INDEX idx_mahasiswa_updated_at (updated_at),
+                        INDEX idx_mahasiswa_nama (nama),
+                        INDEX idx_mahasiswa_jurusan_nama (jurusan, nama)
+                    )
+                ''')
+                
+                # Migrasi tabel lama: encoding JSON -> BLOB biner
+                ensure_column(cursor, 'mahasiswa', 'face_encoding_bin', 'VARBINARY(512) AFTER face_encoding')
+                ensure_column(cursor, 'mahasiswa', 'face_encoding_version', 'TINYINT AFTER face_encoding_bin')
+                ensure_column(cursor, 'mahasiswa', 'updated_at',
+                              'DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')
+                ensure_index(cursor, 'mahasiswa', 'idx_mahasiswa_updated_at', 'updated_at')
+                ensure_index(cursor, 'mahasiswa', 'idx_mahasiswa_nama', 'nama')
+                ensure_index(cursor, 'mahasiswa', 'idx_mahasiswa_jurusan_nama', 'jurusan, nama')
+                migrate_face_encodings(cursor)
+                
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS presensi (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        mahasiswa_id INT NOT NULL,
+                        waktu DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        tipe ENUM('masuk', 'keluar') NOT NULL,
+                        confidence FLOAT,
+                        INDEX idx_presensi_waktu (waktu),
+                        INDEX idx_presensi_mahasiswa_waktu (mahasiswa_id, waktu),
+                        FOREIGN KEY (mahasiswa_id) REFERENCES mahasiswa(id)
+                    )
+                ''')
+                
+                # Index untuk query rentang tanggal pada tabel lama
+                ensure_index(cursor, 'presensi', 'idx_presensi_waktu', 'waktu')
+                ensure_index(cursor, 'presensi', 'idx_presensi_mahasiswa_waktu', 'mahasiswa_id, waktu')
+                
+                # Ringkasan harian (isi ulang dengan: flask --app app rebuild-summary)
+                cursor.execute(SUMMARY_TABLE)
+                
+                # Backfill ringkasan harian dari data presensi yang sudah ada (instalasi lama)
+                cursor.execute("SELECT COUNT(*) FROM presensi_harian")
+                if cursor.fetchone()[0] == 0:
+                    rebuilt = rebuild_summary(cursor)
+                    if rebuilt:
+                        print(f"Daily summary rebuilt: {rebuilt} rows")
+                
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS log (
+                        id INT AUTO_INCREMENT PRIMARY KEY,
+                        user_id INT NOT NULL,
+                        activity TEXT NOT NULL,
+                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (user_id) REFERENCES users(id)
+                    )
+                ''')
+                
+                # Insert default admin user if not exists
+                cursor.execute('SELECT COUNT(*) FROM users')
+                if cursor.fetchone()[0] == 0:
+                    import bcrypt
+                    hashed_password = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt())
+                    cursor.execute(
+                        'INSERT INTO users (username, password, role) VALUES (%s, %s, %s)',
+                        ('admin', hashed_password.decode('utf-8'), 'admin')
+                    )
+                
+                connection.commit()
+                cursor.close()
             
         except Error as e:
             print(f"Error initializing database: {e}")
 
+    @contextmanager
+    def transaction(self):
+        """Menjalankan beberapa query dalam satu transaksi pada satu koneksi pool"""
+        with self.connection() as connection:
+            cursor = connection.cursor(dictionary=True)
+            try:
+                yield cursor
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    @contextmanager
+    def named_lock(self, name, timeout=10):
+        """Lock antar proses memakai GET_LOCK MySQL, dipegang selama blok with"""
+        with self.connection() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT GET_LOCK(%s, %s)", (name, timeout))
+                if cursor.fetchone()[0] != 1:
+                    raise TimeoutError(f"Timed out waiting for lock {name}")
+                try:
+                    yield
+                finally:
+                    cursor.execute("SELECT RELEASE_LOCK(%s)", (name,))
+                    cursor.fetchone()
+            finally:
+                cursor.close()
+
     def execute_query(self, query, params=None):
         try:
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query, params)
-            result = cursor.fetchall()
-            cursor.close()
-            return result
+            with self.connection() as connection:
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute(query, params)
+                result = cursor.fetchall()
+                cursor.close()
+                return result
         except Error as e:
             print(f"Error executing query: {e}")
             return None
 
     def execute_insert(self, query, params=None):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            self.connection.commit()
-            last_id = cursor.lastrowid
-            cursor.close()
-            return last_id
+            with self.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                connection.commit()
+                last_id = cursor.lastrowid
+                cursor.close()
+                return last_id
         except Error as e:
             print(f"Error executing insert: {e}")
             return None
 
+    def stream_query(self, query, params=None, chunk_size=1000):
+        """Generator baris hasil query dari cursor tanpa buffer, diambil per chunk.
+        
+        Hasil tidak pernah dimuat seluruhnya ke memori. Koneksi dipinjam dari
+        pool sampai generator habis atau ditutup.
+        """
+        with self.connection() as connection:
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            exhausted = False
+            try:
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        exhausted = True
+                        break
+                    yield from rows
+            finally:
+                if not exhausted:
+                    # Klien berhenti di tengah jalan: sisa hasil harus dibaca sebelum koneksi kembali ke pool
+                    connection.consume_results()
+                cursor.close()
+
+    def execute_many(self, query, seq_params):
+        """Menjalankan satu query untuk banyak baris parameter dalam satu transaksi"""
+        try:
+            with self.connection() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.executemany(query, seq_params)
+                    connection.commit()
+                    return cursor.rowcount
+                except Error:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+        except Error as e:
+            print(f"Error executing batch: {e}")
+            return None
+
     def execute_update(self, query, params=None):
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(query, params)
-            self.connection.commit()
-            affected_rows = cursor.rowcount
-            cursor.close()
-            return affected_rows
+            with self.connection() as connection:
+                cursor = connection.cursor()
+                cursor.execute(query, params)
+                connection.commit()
+                affected_rows = cursor.rowcount
+                cursor.close()
+                return affected_rows
         except Error as e:
             print(f"Error executing update: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,241 @@
+import os
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import face_recognition
+import numpy as np
+
+from face_utils import decode_image, detect_faces
+from gallery import ENCODING_VERSION, pack_encoding
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Foto ID yang lebih besar diperkecil dulu; HOG pada ribuan foto beresolusi penuh sangat lambat
+MAX_PHOTO_SIZE = 1024
+
+_UPDATE_ENCODING = ("UPDATE mahasiswa SET face_encoding_bin = %s, face_encoding_version = %s, "
+                    "face_encoding = NULL WHERE id = %s")
+
+
+def _nim_from_path(path, known) -> Optional[str]:
+    """NIM dari nama file (<nim>.jpg) atau nama folder (<nim>/foto1.jpg)"""
+    parts = [p for p in path.replace('\\', '/').split('/') if p]
+    if not parts or parts[-1].startswith('.') or not parts[-1].lower().endswith(IMAGE_EXTENSIONS):
+        return None
+    stem = os.path.splitext(parts[-1])[0]
+    if len(parts) >= 2 and stem not in known and parts[-2] in known:
+        return parts[-2]
+    return stem
+
+
+def iter_photos(source, known=()) -> Iterator[Tuple[str, List[bytes]]]:
+    """Membaca foto per NIM dari direktori atau file ZIP, satu NIM per langkah.
+
+    Foto bernama <nim>.jpg, atau disimpan di folder <nim>/ bila ada beberapa
+    foto per mahasiswa. known berisi NIM terdaftar untuk memilih di antara
+    keduanya; foto NIM yang tidak terdaftar tidak dibaca.
+
+    Hanya daftar nama file yang dikumpulkan di awal; isi foto dibaca saat
+    NIM tersebut diproses sehingga memori tidak bergantung jumlah foto.
+    """
+    groups: Dict[str, List[str]] = {}
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in archive.namelist():
+                nim = _nim_from_path(name, known)
+                if nim:
+                    groups.setdefault(nim, []).append(name)
+            for nim in sorted(groups):
+                if known and nim not in known:
+                    yield nim, []
+                    continue
+                yield nim, [archive.read(name) for name in groups[nim]]
+        return
+
+    for root, _, files in os.walk(source):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            nim = _nim_from_path(os.path.relpath(path, source), known)
+            if nim:
+                groups.setdefault(nim, []).append(path)
+    for nim in sorted(groups):
+        if known and nim not in known:
+            yield nim, []
+            continue
+        photos = []
+        for path in groups[nim]:
+            with open(path, 'rb') as f:
+                photos.append(f.read())
+        yield nim, photos
+
+
+def encode_photos(nim, photos) -> Tuple[str, Optional[bytes], Optional[str]]:
+    """Decode, deteksi dan encode semua foto satu mahasiswa (dijalankan di proses worker).
+
+    Encoding dari setiap foto berisi tepat satu wajah dirata-rata seperti
+    sampel kamera di save_face. Mengembalikan (nim, blob encoding, error).
+    """
+    encodings = []
+    error = 'Tidak ada foto yang valid'
+    for payload in photos:
+        frame = decode_image(payload)
+        if frame is None:
+            error = 'File bukan gambar yang valid'
+            continue
+
+        scale = MAX_PHOTO_SIZE / max(frame.shape[:2])
+        if scale < 1.0:
+            frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+        rgb_frame = np.ascontiguousarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        locations = detect_faces(rgb_frame)
+        if len(locations) != 1:
+            error = 'Wajah tidak terdeteksi' if not locations else 'Terdeteksi lebih dari 1 wajah'
+            continue
+
+        face_encodings = face_recognition.face_encodings(rgb_frame, locations, num_jitters=1)
+        if face_encodings:
+            encodings.append(face_encodings[0])
+
+    if not encodings:
+        return nim, None, error
+    return nim, pack_encoding(np.mean(encodings, axis=0)), None
+
+
+class EnrollmentReport:
+    """Progres dan hasil satu proses enrollment massal"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.total = 0
+        self.processed = 0
+        self.enrolled = 0
+        self.failures: List[dict] = []
+        self.status = 'running'
+        self.error = None
+        self.finished_at = None
+
+    def fail(self, nim, reason):
+        self.failures.append({'nim': nim, 'reason': reason})
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'total': self.total,
+            'processed': self.processed,
+            'enrolled': self.enrolled,
+            'failed': len(self.failures),
+            'failures': self.failures,
+            'error': self.error,
+            'finished_at': self.finished_at
+        }
+
+
+def bulk_enroll(db, source, workers=None, batch_size=200, report=None,
+                progress: Optional[Callable[[EnrollmentReport], None]] = None) -> EnrollmentReport:
+    """Mendaftarkan wajah massal dari direktori/ZIP foto yang diberi nama NIM.
+
+    Foto di-decode, dideteksi dan di-encode paralel di proses worker dengan
+    jumlah foto dalam proses dibatasi. Encoding ditulis dengan executemany per
+    batch, satu transaksi per batch.
+    """
+    report = report or EnrollmentReport()
+    workers = workers or os.cpu_count() or 1
+
+    # Hanya kolom ringan; encoding lama tidak perlu dibaca
+    students = {row['nim']: row['id'] for row in db.execute_query("SELECT id, nim FROM mahasiswa") or []}
+
+    batch = []
+
+    def flush():
+        if batch:
+            if db.execute_many(_UPDATE_ENCODING, [(blob, version, students[nim]) for nim, blob, version in batch]) is None:
+                for nim, _, _ in batch:
+                    report.fail(nim, 'Gagal menyimpan ke database')
+            else:
+                report.enrolled += len(batch)
+            batch.clear()
+
+    def collect(item):
+        nim, future = item
+        try:
+            _, blob, error = future.result()
+        except Exception as e:
+            # Satu foto yang bermasalah tidak menghentikan seluruh enrollment
+            blob, error = None, f'Error: {e}'
+        report.processed += 1
+        if blob is None:
+            report.fail(nim, error)
+        else:
+            batch.append((nim, blob, ENCODING_VERSION))
+            if len(batch) >= batch_size:
+                flush()
+        if progress:
+            progress(report)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for nim, photos in iter_photos(source, students):
+                report.total += 1
+                if nim not in students:
+                    report.processed += 1
+                    report.fail(nim, 'NIM tidak terdaftar')
+                    continue
+
+                pending.append((nim, executor.submit(encode_photos, nim, photos)))
+                # Batasi foto yang menunggu di memori
+                while len(pending) >= workers * 4:
+                    collect(pending.popleft())
+
+            while pending:
+                collect(pending.popleft())
+        flush()
+        report.status = 'done'
+    except Exception as e:
+        report.status = 'error'
+        report.error = str(e)
+        print(f"Error in bulk enrollment: {e}")
+
+    report.finished_at = time.time()
+    return report
+
+
+def start_bulk_enroll(db, source, on_done=None, store=None, save_every=50, **kwargs) -> EnrollmentReport:
+    """Menjalankan bulk_enroll di thread latar; progres dibaca dari report yang dikembalikan.
+
+    Dengan store (JobStore), progres juga ditulis ke sana setiap save_every
+    NIM dan saat selesai, agar bisa dibaca proses lain.
+    """
+    report = EnrollmentReport()
+    progress = kwargs.pop('progress', None)
+
+    def save_progress(report):
+        if progress:
+            progress(report)
+        if report.processed % save_every == 0:
+            store.write(report.id, report.to_dict())
+
+    if store is not None:
+        store.write(report.id, report.to_dict())
+        kwargs['progress'] = save_progress
+    elif progress:
+        kwargs['progress'] = progress
+
+    def run():
+        bulk_enroll(db, source, report=report, **kwargs)
+        if store is not None:
+            store.write(report.id, report.to_dict())
+        if on_done:
+            on_done(report)
+
+    threading.Thread(target=run, daemon=True).start()
+    return report
@@ -0,0 +1,63 @@
+import json
+import queue
+import threading
+
+
+class EventBus:
+    """Bus event in-process untuk mengirim presensi ke browser lewat Server-Sent Events.
+
+    Setiap klien punya antrian berkapasitas tetap. Bila klien lambat dan
+    antriannya penuh, event tertua dibuang sehingga memori tetap terbatas.
+    """
+
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        """Mengirim event ke semua klien yang terhubung"""
+        message = (event, data)
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            while True:
+                try:
+                    subscriber.put_nowait(message)
+                    break
+                except queue.Full:
+                    # Buang event tertua milik klien yang lambat
+                    try:
+                        subscriber.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def stream(self, heartbeat=15):
+        """Generator teks SSE untuk satu klien, dengan komentar heartbeat agar koneksi tetap hidup"""
+        subscriber = self.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ': ping\n\n'
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            self.unsubscribe(subscriber)
@@ -0,0 +1,90 @@
+import csv
+import io
+import os
+import tempfile
+
+from openpyxl import Workbook
+
+# Kolom export presensi: (key baris, judul kolom)
+EXPORT_COLUMNS = [
+    ('nim', 'NIM'),
+    ('nama', 'Nama'),
+    ('jurusan', 'Jurusan'),
+    ('tipe', 'Tipe'),
+    ('waktu', 'Waktu'),
+    ('confidence', 'Confidence'),
+]
+
+
+def presensi_rows(db, start, end, jurusan=None):
+    """Baris presensi dalam rentang [start, end) dibaca bertahap dari cursor tanpa buffer"""
+    query = '''
+        SELECT m.nim, m.nama, m.jurusan, p.tipe, p.waktu, p.confidence
+        FROM presensi p
+        JOIN mahasiswa m ON p.mahasiswa_id = m.id
+        WHERE p.waktu >= %s AND p.waktu < %s
+    '''
+    params = [start, end]
+    if jurusan:
+        query += " AND m.jurusan = %s"
+        params.append(jurusan)
+    query += " ORDER BY p.waktu"
+    return db.stream_query(query, tuple(params))
+
+
+def _row_values(row):
+    values = [row[key] for key, _ in EXPORT_COLUMNS]
+    values[4] = row['waktu'].strftime('%Y-%m-%d %H:%M:%S')
+    values[5] = round(float(row['confidence']), 4) if row['confidence'] is not None else None
+    return values
+
+
+def csv_stream(rows, flush_rows=500):
+    """Generator CSV (UTF-8 dengan BOM agar terbaca Excel) yang dikirim per beberapa ratus baris"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([title for _, title in EXPORT_COLUMNS])
+
+    for count, row in enumerate(rows, 1):
+        writer.writerow(_row_values(row))
+        if count % flush_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode('utf-8')
+
+
+def write_xlsx(rows, sheet_name='Presensi') -> str:
+    """Menulis XLSX dengan openpyxl mode write-only (memori konstan) ke file sementara.
+
+    Mengembalikan path file; pemanggil bertanggung jawab menghapusnya.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name[:31])
+    sheet.append([title for _, title in EXPORT_COLUMNS])
+    for row in rows:
+        sheet.append(_row_values(row))
+
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook.save(path)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def file_stream(path, chunk_size=64 * 1024):
+    """Mengirim file per chunk lalu menghapusnya"""
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        os.remove(path)
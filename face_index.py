@@ -0,0 +1,146 @@
+import numpy as np
+
+
+def _squared_distances(queries, points, points_sq=None):
+    q_sq = np.einsum('ij,ij->i', queries, queries)
+    if points_sq is None:
+        points_sq = np.einsum('ij,ij->i', points, points)
+    sq_dist = q_sq[:, None] + points_sq[None, :] - 2.0 * (queries @ points.T)
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return sq_dist
+
+
+class IVFIndex:
+    """Index IVF (inverted file) dengan coarse quantizer k-means, murni NumPy.
+
+    Encoding dikelompokkan ke `nlist` centroid. Saat pencarian hanya `nprobe`
+    kelompok terdekat yang dijadikan kandidat, lalu FaceGallery menghitung
+    jarak exact pada kandidat tersebut (rerank), sehingga arti threshold
+    tidak berubah. Semakin besar nprobe, recall semakin tinggi dan latensi
+    semakin besar.
+    """
+
+    def __init__(self, nlist=0, nprobe=8, min_size=1000, train_iters=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_size = min_size
+        self.train_iters = train_iters
+        self.seed = seed
+
+        self.centroids = None
+        self._centroid_sq = None
+        self._labels = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._trained_size = 0
+        self._lists = None
+
+    def usable(self, size) -> bool:
+        """Index hanya dipakai bila galeri cukup besar dan sudah dilatih"""
+        return self.centroids is not None and size >= self.min_size
+
+    def _train(self, encodings):
+        rng = np.random.default_rng(self.seed)
+        n = len(encodings)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        # Latih k-means pada sampel agar waktu build tetap terkendali
+        sample_size = min(n, max(nlist * 64, 10000))
+        sample = encodings[rng.choice(n, sample_size, replace=False)] if sample_size < n else encodings
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+        for _ in range(self.train_iters):
+            labels = self._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+
+            # Centroid kosong diisi ulang dengan titik acak
+            empty = counts == 0
+            centroids[~empty] = sums[~empty] / counts[~empty, None]
+            if empty.any():
+                centroids[empty] = sample[rng.choice(len(sample), int(empty.sum()), replace=False)]
+
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self._centroid_sq = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self._trained_size = n
+
+    def _assign(self, points, centroids=None, chunk_size=8192):
+        if centroids is None:
+            centroids, centroid_sq = self.centroids, self._centroid_sq
+        else:
+            centroid_sq = np.einsum('ij,ij->i', centroids, centroids)
+
+        labels = np.empty(len(points), dtype=np.int32)
+        for start in range(0, len(points), chunk_size):
+            chunk = points[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmin(_squared_distances(chunk, centroids, centroid_sq), axis=1)
+        return labels
+
+    def build(self, encodings):
+        """Melatih centroid dan mengelompokkan seluruh encoding galeri"""
+        self._size = len(encodings)
+        self._lists = None
+        if self._size < self.min_size:
+            self.centroids = None
+            self._labels = np.empty(0, dtype=np.int32)
+            return
+
+        self._train(encodings)
+        self._labels = self._assign(encodings)
+
+    def add(self, position, encoding, encodings):
+        """Dipanggil FaceGallery saat satu encoding ditambahkan di akhir galeri"""
+        self._size = position + 1
+        if self.centroids is None or self._size > 4 * self._trained_size:
+            # Belum dilatih atau galeri sudah tumbuh jauh: latih ulang
+            self.build(encodings)
+            return
+
+        if len(self._labels) <= position:
+            labels = np.empty(max(16, 2 * len(self._labels)), dtype=np.int32)
+            labels[:len(self._labels)] = self._labels
+            self._labels = labels
+        self._labels[position] = self._assign(encoding[None, :])[0]
+        self._lists = None
+
+    def update(self, position, encoding):
+        """Dipanggil FaceGallery saat encoding pada posisi tertentu diganti"""
+        if self.centroids is not None:
+            self._labels[position] = self._assign(encoding[None, :])[0]
+            self._lists = None
+
+    def remove(self, position, last):
+        """Dipanggil FaceGallery saat baris terakhir dipindah ke posisi yang dihapus"""
+        if self.centroids is not None:
+            self._labels[position] = self._labels[last]
+            self._lists = None
+        self._size = last
+
+    def _inverted_lists(self):
+        if self._lists is None:
+            labels = self._labels[:self._size]
+            order = np.argsort(labels, kind='stable')
+            bounds = np.searchsorted(labels[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+        return self._lists
+
+    def candidates(self, query) -> np.ndarray:
+        """Posisi galeri yang berada di nprobe kelompok terdekat dari query"""
+        lists = self._inverted_lists()
+        nprobe = min(self.nprobe, len(lists))
+        sq_dist = _squared_distances(query[None, :], self.centroids, self._centroid_sq)[0]
+        probes = np.argpartition(sq_dist, nprobe - 1)[:nprobe] if nprobe < len(lists) else range(len(lists))
+        return np.concatenate([lists[p] for p in probes])
+
+
+def create_index(config):
+    """Membuat index sesuai FACE_INDEX di Config, None berarti linear scan"""
+    kind = config.FACE_INDEX.lower()
+    if kind == 'linear':
+        return None
+    if kind == 'ivf':
+        return IVFIndex(nlist=config.FACE_INDEX_NLIST,
+                        nprobe=config.FACE_INDEX_NPROBE,
+                        min_size=config.FACE_INDEX_MIN_SIZE)
+    raise ValueError(f"Unknown FACE_INDEX: {config.FACE_INDEX}")
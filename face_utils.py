@@ -1,49 +1,243 @@
 import cv2
 import face_recognition
 import numpy as np
-import json
 from typing import List, Tuple, Optional
 import os
 from datetime import datetime
 from config import Config
+from attendance import AttendanceState, record_presensi
+from face_index import create_index
+from tracking import FaceTracker
+from gallery import FaceGallery, ENCODING_BYTES, ENCODING_VERSION, unpack_encoding, unpack_encodings
+from shared_gallery import SharedGallery
+from snapshot import load_snapshot, save_snapshot
+
+# Lock MySQL yang dipegang loop presensi; hanya satu proses yang mencatat presensi
+RECORDER_LOCK = 'presensi_recorder'
+
+def decode_image(data) -> Optional[np.ndarray]:
+    """Decode byte JPEG/PNG menjadi frame BGR, None bila data bukan gambar"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if buffer.size == 0:
+        return None
+    return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+
+def detect_faces(rgb_frame, scale=1.0, upsample=1) -> List[Tuple[int, int, int, int]]:
+    """Deteksi wajah (HOG) pada frame yang diperkecil, koordinat dikembalikan ke resolusi penuh"""
+    if scale >= 1.0:
+        return face_recognition.face_locations(rgb_frame, number_of_times_to_upsample=upsample, model="hog")
+    
+    small_frame = cv2.resize(rgb_frame, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    small_frame = np.ascontiguousarray(small_frame)
+    locations = face_recognition.face_locations(small_frame, number_of_times_to_upsample=upsample, model="hog")
+    
+    height, width = rgb_frame.shape[:2]
+    return [
+        (max(0, int(round(top / scale))), min(width, int(round(right / scale))),
+         min(height, int(round(bottom / scale))), max(0, int(round(left / scale))))
+        for top, right, bottom, left in locations
+    ]
+
 
 class FaceRecognition:
     def __init__(self):
         config = Config()
-        self.known_face_encodings = []
-        self.known_face_ids = []
-        self.known_face_data = []
+        self.config = config
+        self.gallery = FaceGallery(index=create_index(config))
+        self.watermark = None
+        # Galeri shared memory (opsional) dan generation yang sedang dipetakan
+        self.shared: Optional[SharedGallery] = None
+        self.shared_generation = 0
+        self.snapshot_path = config.GALLERY_SNAPSHOT_PATH
         self.threshold = config.FACE_RECOGNITION_THRESHOLD
+        self.detection_scale = config.FACE_DETECTION_SCALE
+        self.track_iou = config.FACE_TRACK_IOU
+        self.track_reverify_frames = config.FACE_TRACK_REVERIFY_FRAMES
+        self.track_max_misses = config.FACE_TRACK_MAX_MISSES
+        # Presensi terakhir hari ini per mahasiswa, dipakai bersama semua loop presensi
+        self.attendance = AttendanceState()
+        self.attendance_cooldown = config.ATTENDANCE_COOLDOWN
         
+    def _get_watermark(self, db):
+        """Penanda perubahan tabel mahasiswa: jumlah baris, id terbesar, dan updated_at terakhir"""
+        result = db.execute_query(
+            "SELECT COUNT(*) AS total, MAX(id) AS max_id, MAX(updated_at) AS last_update FROM mahasiswa"
+        )
+        return result[0] if result else None
+
+    def _row_to_face(self, row):
+        blob = row['face_encoding_bin']
+        if row['face_encoding_version'] != ENCODING_VERSION or len(blob) != ENCODING_BYTES:
+            print(f"Error loading encoding for {row['nama']}: unsupported format")
+            return None, None
+        
+        face_data = {
+            'id': row['id'],
+            'nim': row['nim'],
+            'nama': row['nama']
+        }
+        return face_data, blob
+
     def load_face_encodings_from_db(self, db):
         """Memuat encoding wajah dari database"""
         try:
+            watermark = self._get_watermark(db)
             results = db.execute_query(
-                "SELECT id, nim, nama, face_encoding FROM mahasiswa WHERE face_encoding IS NOT NULL"
+                "SELECT id, nim, nama, face_encoding_bin, face_encoding_version FROM mahasiswa "
+                "WHERE face_encoding_bin IS NOT NULL"
             )
             
-            self.known_face_encodings = []
-            self.known_face_ids = []
-            self.known_face_data = []
+            blobs = []
+            face_data = []
             
             for row in results:
-                try:
-                    encoding = json.loads(row['face_encoding'])
-                    self.known_face_encodings.append(np.array(encoding))
-                    self.known_face_ids.append(row['id'])
-                    self.known_face_data.append({
-                        'id': row['id'],
-                        'nim': row['nim'],
-                        'nama': row['nama']
-                    })
-                except Exception as e:
-                    print(f"Error loading encoding for {row['nama']}: {e}")
+                data, blob = self._row_to_face(row)
+                if data is not None:
+                    blobs.append(blob)
+                    face_data.append(data)
             
-            print(f"Loaded {len(self.known_face_encodings)} face encodings")
+            # Semua BLOB langsung menjadi satu matriks contiguous tanpa parsing teks
+            self.gallery = FaceGallery(unpack_encodings(blobs), face_data, index=create_index(self.config))
+            self.watermark = watermark
+            
+            print(f"Loaded {len(self.gallery)} face encodings")
             
         except Exception as e:
             print(f"Error loading face encodings from database: {e}")
 
+    def load_gallery(self, db):
+        """Memuat galeri saat startup.
+        
+        Snapshot di disk dipetakan langsung (mmap) lalu hanya baris yang berubah
+        sejak watermark snapshot yang diambil dari database. Tanpa snapshot
+        yang valid, galeri dimuat penuh dari database. Snapshot ditulis ulang
+        bila database lebih baru.
+        """
+        if self.snapshot_path:
+            snapshot = load_snapshot(self.snapshot_path, index=create_index(self.config))
+            if snapshot is not None:
+                self.gallery, self.watermark = snapshot
+                print(f"Mapped {len(self.gallery)} face encodings from snapshot {self.snapshot_path}")
+        
+        watermark = self.watermark
+        self.sync_from_db(db)
+        
+        if self.snapshot_path and self.watermark is not None and self.watermark != watermark:
+            try:
+                save_snapshot(self.snapshot_path, self.gallery, self.watermark)
+            except OSError as e:
+                print(f"Error writing gallery snapshot: {e}")
+
+    def use_shared_gallery(self, shared: SharedGallery):
+        """Memakai galeri di shared memory yang dipublish bersama oleh semua proses"""
+        self.shared = shared
+        self.refresh_shared()
+
+    def refresh_shared(self):
+        """Memetakan galeri shared terbaru bila generation berubah (cukup baca 8 byte bila tidak)"""
+        if self.shared is None or self.shared.generation == self.shared_generation:
+            return
+        attached = self.shared.attach(index=create_index(self.config))
+        if attached is not None:
+            self.shared_generation, self.gallery, self.watermark = attached
+
+    def sync_from_db(self, db):
+        """Memperbarui galeri dari database.
+        
+        Dengan galeri shared, watermark dicek dulu tanpa lock; hanya bila
+        database berubah, sinkronisasi dilakukan di bawah lock database (satu
+        publisher untuk semua proses) lalu hasilnya dipublish sebagai
+        generation baru. Lock tidak ditunggu: bila proses lain sedang publish,
+        perubahan yang tertinggal diambil pada sync berikutnya.
+        """
+        if self.shared is None:
+            self._sync_gallery(db)
+            return
+        
+        try:
+            self.refresh_shared()
+            if self.shared_generation and self.watermark is not None and self._get_watermark(db) == self.watermark:
+                return
+            
+            # Menunggu lock sambil memegang koneksi pool bisa menghabiskan pool,
+            # sementara pemegang lock butuh koneksi kedua untuk query sinkronisasi
+            with db.named_lock(f"{self.shared.name}_publish", timeout=0):
+                # Mulai dari galeri terbaru yang mungkin dipublish proses lain
+                self.refresh_shared()
+                watermark = self.watermark
+                self._sync_gallery(db)
+                if self.watermark is None or (self.shared_generation and self.watermark == watermark):
+                    return
+                self.shared.publish(self.gallery, self.watermark)
+            
+            # Proses ini juga kembali memakai view shared, bukan salinan privat
+            self.refresh_shared()
+            print(f"Published shared gallery generation {self.shared_generation}")
+            
+        except TimeoutError:
+            # Proses lain sedang publish
+            return
+        except Exception as e:
+            print(f"Error publishing shared gallery: {e}")
+
+    def _sync_gallery(self, db):
+        """Memperbarui galeri hanya untuk baris yang berubah sejak pemuatan terakhir"""
+        if self.watermark is None or self.watermark['last_update'] is None:
+            self.load_face_encodings_from_db(db)
+            return
+        
+        try:
+            watermark = self._get_watermark(db)
+            if watermark == self.watermark:
+                return
+            
+            # updated_at berpresisi detik, jadi baris pada detik yang sama diambil ulang
+            changed = db.execute_query(
+                "SELECT id, nim, nama, face_encoding_bin, face_encoding_version FROM mahasiswa "
+                "WHERE updated_at >= %s",
+                (self.watermark['last_update'],)
+            )
+            
+            new_rows = 0
+            for row in changed:
+                if row['id'] > (self.watermark['max_id'] or 0):
+                    new_rows += 1
+                
+                data, blob = (None, None)
+                if row['face_encoding_bin'] is not None:
+                    data, blob = self._row_to_face(row)
+                
+                if data is not None:
+                    self.gallery.upsert(data, unpack_encoding(blob))
+                else:
+                    self.gallery.remove(row['id'])
+            
+            # Jumlah baris tidak cocok berarti ada mahasiswa yang dihapus
+            if watermark['total'] != self.watermark['total'] + new_rows:
+                face_ids = db.execute_query("SELECT id FROM mahasiswa WHERE face_encoding_bin IS NOT NULL")
+                existing = {row['id'] for row in face_ids}
+                for mahasiswa_id in set(self.gallery.ids) - existing:
+                    self.gallery.remove(mahasiswa_id)
+            
+            self.watermark = watermark
+            print(f"Synced {len(changed)} changed rows, {len(self.gallery)} face encodings")
+            
+        except Exception as e:
+            print(f"Error syncing face encodings from database: {e}")
+
+    def update_face(self, mahasiswa_id, nim, nama, encoding):
+        """Menambah atau memperbarui satu wajah di galeri tanpa memuat ulang database"""
+        self.gallery.upsert({'id': mahasiswa_id, 'nim': nim, 'nama': nama}, encoding)
+
+    def remove_face(self, mahasiswa_id):
+        """Menghapus satu wajah dari galeri"""
+        return self.gallery.remove(mahasiswa_id)
+
+    def detect_faces(self, rgb_frame):
+        """Deteksi wajah dengan skala FACE_DETECTION_SCALE"""
+        return detect_faces(rgb_frame, self.detection_scale)
+
     def preprocess_frame(self, frame):
         """Preprocess frame untuk memastikan format yang benar"""
         try:
@@ -107,7 +301,7 @@ class FaceRecognition:
                 rgb_frame = np.ascontiguousarray(rgb_frame)
                 
                 # Find faces
-                face_locations = face_recognition.face_locations(rgb_frame, model="hog")
+                face_locations = self.detect_faces(rgb_frame)
                 face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
                 
                 # Draw rectangles around faces
@@ -147,11 +341,33 @@ class FaceRecognition:
         
         return None
 
-    def recognize_face(self, frame) -> Tuple[Optional[int], Optional[str], Optional[str], float]:
-        """Mengenali wajah dalam frame"""
-        if len(self.known_face_encodings) == 0:
-            return None, None, None, 0.0
+    def match_encodings(self, face_encodings, face_locations) -> List[dict]:
+        """Mencocokkan semua encoding wajah dengan galeri dalam satu perhitungan jarak"""
+        self.refresh_shared()
+        results = []
+        matches = self.gallery.best_matches(face_encodings) if len(face_encodings) > 0 else []
+        
+        for location, (face_data, distance) in zip(face_locations, matches):
+            result = {
+                'id': None,
+                'nim': None,
+                'nama': None,
+                'confidence': 0.0,
+                'location': tuple(int(v) for v in location)
+            }
+            if face_data is not None and distance <= self.threshold:
+                result.update(id=face_data['id'], nim=face_data['nim'], nama=face_data['nama'],
+                              confidence=1 - distance)
+            results.append(result)
         
+        return results
+
+    def recognize_faces(self, frame) -> List[dict]:
+        """Mengenali semua wajah dalam frame.
+        
+        Setiap hasil berisi id, nim, nama, confidence dan location
+        (top, right, bottom, left). Wajah yang tidak dikenali memiliki id None.
+        """
         try:
             # Preprocess frame
             frame = self.preprocess_frame(frame)
@@ -161,46 +377,108 @@ class FaceRecognition:
             rgb_frame = np.ascontiguousarray(rgb_frame)
             
             # Find faces
-            face_locations = face_recognition.face_locations(rgb_frame, model="hog")
-            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+            face_locations = self.detect_faces(rgb_frame)
+            if len(face_locations) == 0:
+                return []
             
-            if len(face_encodings) == 0:
-                return None, None, None, 0.0
+            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+            return self.match_encodings(face_encodings, face_locations)
             
-            # Compare with known faces
-            face_encoding = face_encodings[0]
-            matches = face_recognition.compare_faces(self.known_face_encodings, face_encoding, tolerance=self.threshold)
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
+        except Exception as e:
+            print(f"Error in recognize_faces: {e}")
+            return []
+
+    def recognize_tracked(self, frame, tracker: FaceTracker) -> List[dict]:
+        """Seperti recognize_faces, tetapi encoding hanya untuk track baru atau yang perlu diverifikasi ulang"""
+        try:
+            frame = self.preprocess_frame(frame)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            rgb_frame = np.ascontiguousarray(rgb_frame)
             
-            best_match_index = np.argmin(face_distances)
+            tracks = tracker.update(self.detect_faces(rgb_frame))
+            pending = [track for track in tracks if tracker.needs_encoding(track)]
             
-            if matches[best_match_index]:
-                confidence = 1 - face_distances[best_match_index]
-                face_data = self.known_face_data[best_match_index]
-                return face_data['id'], face_data['nim'], face_data['nama'], confidence
+            if pending:
+                face_locations = [track.location for track in pending]
+                face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
+                for track, result in zip(pending, self.match_encodings(face_encodings, face_locations)):
+                    tracker.bind(track, result)
             
-            return None, None, None, 0.0
+            # Wajah yang sudah dikenali cukup memakai identitas dari track
+            return [dict(track.identity, location=tuple(int(v) for v in track.location))
+                    for track in tracks if track.identity is not None]
             
         except Exception as e:
-            print(f"Error in recognize_face: {e}")
+            print(f"Error in recognize_tracked: {e}")
+            return []
+
+    def recognize_face(self, frame) -> Tuple[Optional[int], Optional[str], Optional[str], float]:
+        """Mengenali wajah dalam frame (wajah dengan confidence tertinggi)"""
+        if len(self.gallery) == 0:
+            return None, None, None, 0.0
+        
+        recognized = [r for r in self.recognize_faces(frame) if r['id'] is not None]
+        if not recognized:
             return None, None, None, 0.0
+        
+        best = max(recognized, key=lambda r: r['confidence'])
+        return best['id'], best['nim'], best['nama'], best['confidence']
+
+    def _save_attendance(self, db, result, current_time, callback=None):
+        """Menyimpan presensi masuk/keluar untuk satu wajah yang dikenali (None bila masih cooldown)"""
+        mahasiswa_id = result['id']
+        
+        # Cek ulang saat menyimpan: loop lain mungkin baru saja mencatat mahasiswa ini
+        claimed = self.attendance.claim(db, mahasiswa_id, current_time, self.attendance_cooldown)
+        if claimed is None:
+            return None
+        tipe, first_today = claimed
+        
+        # Save to database (presensi + ringkasan harian)
+        try:
+            record_presensi(db, mahasiswa_id, tipe, result['confidence'], current_time, first_today=first_today)
+        except Exception:
+            # Tidak tersimpan: mahasiswa tidak boleh tertahan cooldown atau tipenya terbalik
+            self.attendance.release(mahasiswa_id)
+            raise
+        self.attendance.record(mahasiswa_id)
+        
+        if callback:
+            callback(result['nim'], result['nama'], tipe, result['confidence'])
+        
+        print(f"Presensi {tipe} dicatat untuk {result['nama']}")
+        return tipe
 
     def run_attendance(self, db, callback=None):
-        """Menjalankan sistem presensi real-time"""
+        """Menjalankan sistem presensi real-time (beberapa wajah per frame).
+        
+        Hanya satu proses yang boleh mencatat presensi, agar masuk/keluar bisa
+        ditentukan dari AttendanceState tanpa query. Mengembalikan False bila
+        presensi sudah berjalan di proses lain atau kamera tidak bisa dibuka.
+        """
+        try:
+            with db.named_lock(RECORDER_LOCK, timeout=0):
+                # Muat ulang: proses lain mungkin mencatat sebelum lock ini didapat
+                self.attendance.warm_up(db)
+                return self._attendance_loop(db, callback)
+        except TimeoutError:
+            print("Attendance is already running in another process")
+            return False
+
+    def _attendance_loop(self, db, callback=None):
         cap = cv2.VideoCapture(0)
         if not cap.isOpened():
             print("Error: Cannot open camera")
-            return
+            return False
         
         # Set camera properties
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         cap.set(cv2.CAP_PROP_FPS, 30)
         
-        last_attendance = {}
-        attendance_cooldown = 5  # seconds
+        tracker = FaceTracker(self.track_iou, self.track_reverify_frames, self.track_max_misses)
         
-        print("Starting attendance system... Press 'q' to quit")
+        print("Starting attendance system... Press 's' to save, 'q' to quit")
         
         while True:
             ret, frame = cap.read()
@@ -212,75 +490,63 @@ class FaceRecognition:
                 # Preprocess frame
                 frame = self.preprocess_frame(frame)
                 
-                # Recognize face
-                mahasiswa_id, nim, nama, confidence = self.recognize_face(frame)
+                # Recognize all faces in frame (identitas dipakai ulang dari tracker)
+                results = self.recognize_tracked(frame, tracker)
                 
                 current_time = datetime.now()
+                # Satu wajah per mahasiswa (track yang terpecah bisa memberi dua hasil untuk id sama)
+                ready = {}
                 
                 # Draw results on frame
-                if mahasiswa_id:
-                    # Check cooldown
-                    if mahasiswa_id in last_attendance:
-                        time_diff = (current_time - last_attendance[mahasiswa_id]).total_seconds()
-                        if time_diff < attendance_cooldown:
-                            status = f"Cooldown: {attendance_cooldown - int(time_diff)}s"
-                            color = (0, 255, 255)  # Yellow
-                        else:
-                            status = "Recognized - Press 's' to save"
-                            color = (0, 255, 0)  # Green
-                    else:
-                        status = "Recognized - Press 's' to save"
-                        color = (0, 255, 0)  # Green
+                for result in results:
+                    top, right, bottom, left = result['location']
+                    mahasiswa_id = result['id']
                     
-                    cv2.putText(frame, f"NIM: {nim}", (10, 30), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    cv2.putText(frame, f"Nama: {nama}", (10, 60), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    cv2.putText(frame, f"Confidence: {confidence:.2f}", (10, 90), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    cv2.putText(frame, status, (10, 120), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
-                    
-                    # Save attendance when 's' is pressed
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('s') and (mahasiswa_id not in last_attendance or 
-                                          (current_time - last_attendance[mahasiswa_id]).total_seconds() >= attendance_cooldown):
-                        
-                        # Determine attendance type
-                        today_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                        today_presensi = db.execute_query(
-                            "SELECT tipe FROM presensi WHERE mahasiswa_id = %s AND waktu >= %s ORDER BY waktu DESC LIMIT 1",
-                            (mahasiswa_id, today_start)
-                        )
+                    if mahasiswa_id:
+                        # Check cooldown
+                        remaining = self.attendance.cooldown_remaining(db, mahasiswa_id, current_time,
+                                                                       self.attendance_cooldown)
                         
-                        if today_presensi and today_presensi[0]['tipe'] == 'masuk':
-                            tipe = 'keluar'
+                        if remaining > 0:
+                            label = f"{result['nama']} ({int(remaining) + 1}s)"
+                            color = (0, 255, 255)  # Yellow
                         else:
-                            tipe = 'masuk'
-                        
-                        # Save to database
-                        db.execute_insert(
-                            "INSERT INTO presensi (mahasiswa_id, tipe, confidence) VALUES (%s, %s, %s)",
-                            (mahasiswa_id, tipe, confidence)
-                        )
-                        
-                        last_attendance[mahasiswa_id] = current_time
-                        
-                        if callback:
-                            callback(nim, nama, tipe, confidence)
+                            label = f"{result['nama']} {result['confidence']:.2f}"
+                            color = (0, 255, 0)  # Green
+                            if mahasiswa_id not in ready or result['confidence'] > ready[mahasiswa_id]['confidence']:
+                                ready[mahasiswa_id] = result
                         
-                        print(f"Presensi {tipe} dicatat untuk {nama}")
+                        cv2.putText(frame, f"NIM: {result['nim']}", (left, bottom + 20),
+                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
+                    else:
+                        label = "Tidak dikenali"
+                        color = (0, 0, 255)  # Red
                     
+                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                    cv2.putText(frame, label, (left, top - 10),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+                
+                if ready:
+                    status = f"{len(ready)} wajah dikenali - Press 's' to save"
+                elif results:
+                    status = "Wajah tidak dikenali"
                 else:
-                    cv2.putText(frame, "Wajah tidak dikenali", (10, 30), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                    cv2.putText(frame, "Press 'q' to quit", (10, 60), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                    status = "Tidak ada wajah"
+                cv2.putText(frame, status, (10, 30),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                cv2.putText(frame, "Press 'q' to quit", (10, 60),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
                 
                 cv2.imshow('Presensi System', frame)
                 
-                if cv2.waitKey(1) & 0xFF == ord('q'):
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
                     break
+                
+                # Save attendance for every recognized face when 's' is pressed
+                if key == ord('s'):
+                    for result in ready.values():
+                        self._save_attendance(db, result, current_time, callback)
                     
             except Exception as e:
                 print(f"Error in attendance loop: {e}")
@@ -291,4 +557,5 @@ class FaceRecognition:
                     break
         
         cap.release()
-        cv2.destroyAllWindows()
\ No newline at end of file
+        cv2.destroyAllWindows()
+        return True
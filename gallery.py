@@ -0,0 +1,242 @@
+import threading
+import numpy as np
+from typing import List, Optional, Tuple
+
+ENCODING_DIM = 128
+
+# Format biner encoding: 128 float32 little-endian = 512 byte.
+# Versi disimpan di kolom face_encoding_version agar format bisa berubah nanti.
+ENCODING_VERSION = 1
+ENCODING_DTYPE = np.dtype('<f4')
+ENCODING_BYTES = ENCODING_DIM * ENCODING_DTYPE.itemsize
+
+
+def pack_encoding(encoding) -> bytes:
+    """Mengubah encoding wajah menjadi BLOB biner 512 byte"""
+    array = np.asarray(encoding, dtype=ENCODING_DTYPE)
+    if array.shape != (ENCODING_DIM,):
+        raise ValueError(f"Encoding must have shape ({ENCODING_DIM},), got {array.shape}")
+    return array.tobytes()
+
+
+def unpack_encoding(blob, version=ENCODING_VERSION) -> np.ndarray:
+    """Mengubah BLOB biner menjadi encoding wajah (tanpa copy)"""
+    if version != ENCODING_VERSION:
+        raise ValueError(f"Unsupported encoding version: {version}")
+    if len(blob) != ENCODING_BYTES:
+        raise ValueError(f"Encoding blob must be {ENCODING_BYTES} bytes, got {len(blob)}")
+    return np.frombuffer(blob, dtype=ENCODING_DTYPE)
+
+
+def unpack_encodings(blobs) -> np.ndarray:
+    """Mengubah sekumpulan BLOB menjadi matriks (N, 128) dalam satu langkah"""
+    buffer = b''.join(blobs)
+    return np.frombuffer(buffer, dtype=ENCODING_DTYPE).reshape(-1, ENCODING_DIM)
+
+
+class FaceGallery:
+    """Galeri encoding wajah dalam satu matriks float32 (N, 128) yang contiguous"""
+
+    def __init__(self, encodings=None, data=None, index=None, sq_norms=None, copy=True):
+        if encodings is None or len(encodings) == 0:
+            encodings = np.empty((0, ENCODING_DIM), dtype=np.float32)
+
+        encodings = np.asarray(encodings, dtype=np.float32)
+        if encodings.ndim != 2 or encodings.shape[1] != ENCODING_DIM:
+            raise ValueError(f"Encodings must have shape (N, {ENCODING_DIM}), got {encodings.shape}")
+
+        self.data = list(data) if data is not None else []
+        if len(self.data) != len(encodings):
+            raise ValueError("Number of encodings and face data must match")
+
+        # Norma kuadrat dihitung sekali saat wajah masuk galeri
+        if sq_norms is None:
+            sq_norms = np.einsum('ij,ij->i', encodings, encodings)
+
+        self._size = len(encodings)
+        if copy:
+            # Buffer dengan kapasitas cadangan agar penambahan satu wajah tidak menyalin ulang matriks
+            self._buffer = np.empty((max(self._size, 16), ENCODING_DIM), dtype=np.float32)
+            self._buffer[:self._size] = encodings
+            self._sq_buffer = np.empty(len(self._buffer), dtype=np.float32)
+            self._sq_buffer[:self._size] = sq_norms
+        else:
+            # Memakai buffer pemanggil apa adanya (mis. view shared memory yang read-only)
+            self._buffer = encodings
+            self._sq_buffer = np.asarray(sq_norms, dtype=np.float32)
+
+        self._positions = {d['id']: i for i, d in enumerate(self.data)}
+        self._lock = threading.RLock()
+        self.version = 0
+
+        # Index ANN opsional (lihat face_index.py); None berarti linear scan
+        self.index = index
+        if self.index is not None:
+            self.index.build(self.encodings)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, mahasiswa_id):
+        return mahasiswa_id in self._positions
+
+    @property
+    def encodings(self) -> np.ndarray:
+        return self._buffer[:self._size]
+
+    @property
+    def sq_norms(self) -> np.ndarray:
+        return self._sq_buffer[:self._size]
+
+    @property
+    def ids(self) -> List[int]:
+        return [d['id'] for d in self.data]
+
+    def _grow(self):
+        capacity = max(len(self._buffer) * 2, 16)
+        buffer = np.empty((capacity, ENCODING_DIM), dtype=np.float32)
+        buffer[:self._size] = self.encodings
+        sq_buffer = np.empty(capacity, dtype=np.float32)
+        sq_buffer[:self._size] = self.sq_norms
+        self._buffer, self._sq_buffer = buffer, sq_buffer
+
+    def _ensure_writable(self):
+        """Copy-on-write: buffer read-only disalin ke buffer milik galeri sebelum diubah"""
+        if not (self._buffer.flags.writeable and self._sq_buffer.flags.writeable):
+            self._grow()
+
+    def upsert(self, face_data: dict, encoding):
+        """Menambah wajah baru atau memperbarui wajah mahasiswa yang sudah ada"""
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(ENCODING_DIM)
+
+        with self._lock:
+            self._ensure_writable()
+            position = self._positions.get(face_data['id'])
+            if position is None:
+                if self._size == len(self._buffer):
+                    self._grow()
+                position = self._size
+                self.data.append(face_data)
+                self._positions[face_data['id']] = position
+                self._size += 1
+                is_new = True
+            else:
+                self.data[position] = face_data
+                is_new = False
+
+            self._buffer[position] = encoding
+            self._sq_buffer[position] = encoding @ encoding
+            self.version += 1
+
+            if self.index is not None:
+                if is_new:
+                    self.index.add(position, encoding, self.encodings)
+                else:
+                    self.index.update(position, encoding)
+
+    def remove(self, mahasiswa_id) -> bool:
+        """Menghapus wajah mahasiswa dari galeri (baris terakhir dipindah ke posisinya)"""
+        with self._lock:
+            position = self._positions.pop(mahasiswa_id, None)
+            if position is None:
+                return False
+
+            self._ensure_writable()
+
+            last = self._size - 1
+            if position != last:
+                self._buffer[position] = self._buffer[last]
+                self._sq_buffer[position] = self._sq_buffer[last]
+                self.data[position] = self.data[last]
+                self._positions[self.data[position]['id']] = position
+
+            self.data.pop()
+            self._size -= 1
+            self.version += 1
+
+            if self.index is not None:
+                self.index.remove(position, last)
+            return True
+
+    def _exact_distances(self, queries, positions=None) -> np.ndarray:
+        encodings, sq_norms = self.encodings, self.sq_norms
+        if positions is not None:
+            encodings, sq_norms = encodings[positions], sq_norms[positions]
+
+        # |q - g|^2 = |q|^2 + |g|^2 - 2 q.g
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        sq_dist = q_sq[:, None] + sq_norms[None, :] - 2.0 * (queries @ encodings.T)
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        return np.sqrt(sq_dist)
+
+    def distances(self, queries) -> np.ndarray:
+        """Jarak Euclidean (Q, N) antara query dan seluruh galeri dalam satu operasi"""
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            return self._exact_distances(queries)
+
+    @staticmethod
+    def _smallest(distances, k, positions=None):
+        size = distances.shape[1]
+        if k < size:
+            candidates = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(size), distances.shape)
+
+        candidate_distances = np.take_along_axis(distances, candidates, axis=1)
+        order = np.argsort(candidate_distances, axis=1)
+        indices = np.take_along_axis(candidates, order, axis=1)
+        if positions is not None:
+            indices = positions[indices]
+        return indices, np.take_along_axis(candidate_distances, order, axis=1)
+
+    def search(self, queries, k=1) -> Tuple[np.ndarray, np.ndarray]:
+        """Mencari k encoding terdekat untuk setiap query, hasil terurut dari yang terdekat.
+
+        Bila index ANN aktif, index hanya memilih kandidat dan jaraknya tetap
+        dihitung exact. Slot yang tidak terisi bernilai -1 dengan jarak inf.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, self._size)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if k == 0:
+            return indices, distances
+
+        with self._lock:
+            if self.index is None or not self.index.usable(self._size):
+                return self._smallest(self._exact_distances(queries), k)
+
+            for row, query in enumerate(queries):
+                positions = self.index.candidates(query)
+                if len(positions) == 0:
+                    continue
+
+                # Rerank exact pada kandidat dari index
+                n = min(k, len(positions))
+                found, found_distances = self._smallest(self._exact_distances(query[None, :], positions), n, positions)
+                indices[row, :n] = found[0]
+                distances[row, :n] = found_distances[0]
+
+        return indices, distances
+
+    def top_k(self, encoding, k=5) -> List[Tuple[dict, float]]:
+        """Mengembalikan k data mahasiswa terdekat beserta jaraknya"""
+        with self._lock:
+            indices, distances = self.search(encoding, k)
+            return [(self.data[i], float(d)) for i, d in zip(indices[0], distances[0]) if i >= 0]
+
+    def best_matches(self, encodings) -> List[Tuple[Optional[dict], float]]:
+        """Data mahasiswa terdekat untuk setiap encoding, dihitung dalam satu operasi (wajah x galeri)"""
+        encodings = np.atleast_2d(np.asarray(encodings, dtype=np.float32))
+        with self._lock:
+            if len(self) == 0:
+                return [(None, float('inf'))] * len(encodings)
+
+            indices, distances = self.search(encodings, 1)
+            return [(self.data[i], float(d)) if i >= 0 else (None, float('inf'))
+                    for i, d in zip(indices[:, 0], distances[:, 0])]
+
+    def best_match(self, encoding) -> Tuple[Optional[dict], float]:
+        """Mengembalikan data mahasiswa terdekat beserta jaraknya"""
+        return self.best_matches(encoding)[0]
@@ -0,0 +1,57 @@
+import json
+import os
+import re
+import tempfile
+import time
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobStore:
+    """Status job latar sebagai file <id>.json di direktori bersama.
+
+    Semua proses worker WSGI membaca direktori yang sama, sehingga status
+    bisa diminta ke worker mana pun, bukan hanya worker yang memulai job.
+    File job (termasuk hasilnya, mis. <id>.pdf) dihapus setelah ttl detik
+    tanpa perubahan.
+    """
+
+    def __init__(self, directory, ttl=3600):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, job_id, suffix='.json') -> str:
+        if not _JOB_ID.match(job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def write(self, job_id, data):
+        """Menulis status job secara atomik (pembaca tidak pernah melihat file setengah jadi)"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=f"{job_id}.", suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path(job_id))
+
+    def read(self, job_id):
+        """Status job, atau None bila id tidak dikenal atau sudah kedaluwarsa"""
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self.path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def cleanup(self):
+        """Menghapus file job yang tidak berubah lebih dari ttl detik"""
+        expired_before = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            if not _JOB_ID.match(name.split('.', 1)[0]):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < expired_before:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+def _today_start():
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class ReportCache:
+    """Cache hasil laporan/export berdasarkan jenis, rentang tanggal dan filter.
+
+    Tier memori berupa LRU dengan batas total byte; tier disk (opsional) hanya
+    menyimpan rentang yang sudah tertutup (berakhir sebelum hari ini), karena
+    presensi hari lalu tidak berubah lagi sehingga entri itu tidak pernah
+    kedaluwarsa. Entri yang mencakup hari ini hanya disimpan di memori, dibuang
+    oleh invalidate_open() saat presensi baru dicatat, dan paling lama hidup
+    open_ttl detik (presensi bisa dicatat oleh proses lain).
+
+    Setiap key memuat generation dari file penanda bersama; clear() di proses
+    mana pun mengganti file itu, sehingga semua proses berhenti memakai entri
+    lama tanpa query ke database.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, directory=None, open_ttl=60, marker_path=None):
+        self.max_bytes = max_bytes
+        # Satu entri tidak boleh menghabiskan seluruh tier memori
+        self.max_entry_bytes = max_bytes // 4
+        self.directory = directory or None
+        self.open_ttl = open_ttl
+        self._entries = OrderedDict()  # key -> (data, expires_at atau None bila tertutup)
+        self._size = 0
+        self._lock = threading.Lock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.marker_path = marker_path or os.path.join(self.directory or tempfile.gettempdir(),
+                                                       'presensi_report_cache.generation')
+
+    def generation(self) -> str:
+        """Penanda generation bersama; berubah setiap clear() (cukup satu stat)"""
+        try:
+            stat = os.stat(self.marker_path)
+        except OSError:
+            return '0'
+        return f"{stat.st_ino}-{stat.st_mtime_ns}"
+
+    def key(self, kind, start, end, **filters) -> str:
+        """Key entri; diambil sebelum query agar hasil yang dihitung sebelum clear() tidak dipakai lagi"""
+        parts = [kind, start.isoformat(), end.isoformat(), self.generation()]
+        parts += [f"{name}={value}" for name, value in sorted(filters.items()) if value]
+        return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+    def _expires_at(self, end):
+        """None bila rentang [.., end) sudah tertutup, selain itu batas waktu entri hari ini"""
+        if end <= _today_start():
+            return None
+        return time.monotonic() + self.open_ttl
+
+    def _disk_path(self, key):
+        return os.path.join(self.directory, f"{key}.bin")
+
+    def path(self, key):
+        """Path file di tier disk, atau None bila tidak ada"""
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        return path if os.path.exists(path) else None
+
+    def get(self, key):
+        """Data dari memori, atau dari disk (lalu dimuat ke memori); None bila tidak ada"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                data, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return data
+                self._discard(key)
+
+        path = self.path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        self._remember(key, data, None)
+        return data
+
+    def put(self, key, data, end):
+        """Menyimpan hasil untuk rentang yang berakhir pada end"""
+        expires_at = self._expires_at(end)
+        if expires_at is None and self.directory:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        self._remember(key, data, expires_at)
+
+    def put_file(self, key, path, end):
+        """Menyimpan file hasil tanpa membacanya ke memori bila bisa.
+
+        Rentang tertutup dipindahkan ke tier disk dan path barunya dikembalikan.
+        Selain itu file disalin ke memori (bila cukup kecil) dan None
+        dikembalikan; file asli tetap milik pemanggil.
+        """
+        expires_at = self._expires_at(end)
+        if expires_at is None and self.directory:
+            target = self._disk_path(key)
+            tmp_path = f"{target}.{os.getpid()}.tmp"
+            shutil.move(path, tmp_path)
+            os.replace(tmp_path, target)
+            return target
+
+        if os.path.getsize(path) <= self.max_entry_bytes:
+            with open(path, 'rb') as f:
+                self._remember(key, f.read(), expires_at)
+        return None
+
+    def _remember(self, key, data, expires_at):
+        if len(data) > self.max_entry_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (data, expires_at)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry[0])
+
+    def invalidate_open(self):
+        """Membuang semua entri yang mencakup hari ini (dipanggil setelah presensi baru)"""
+        with self._lock:
+            for key in [k for k, (_, expires_at) in self._entries.items() if expires_at is not None]:
+                self._discard(key)
+
+    def clear(self):
+        """Membuang semua entri di semua proses, termasuk tier disk (mis. setelah data mahasiswa berubah)"""
+        # File penanda baru (inode baru) mengubah generation untuk semua proses
+        marker_dir = os.path.dirname(self.marker_path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=marker_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(time.time()))
+        os.replace(tmp_path, self.marker_path)
+
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith('.bin'):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
@@ -0,0 +1,248 @@
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from exports import presensi_rows
+from job_store import JobStore
+
+# Jumlah baris per tabel; tabel kecil per halaman jauh lebih cepat di-layout
+# daripada satu tabel raksasa yang dipecah reportlab berulang kali
+ROWS_PER_TABLE = 35
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def _time(value):
+    return value.strftime('%H:%M:%S') if value else '-'
+
+
+def _detail_report(db, start, end, jurusan):
+    """Semua presensi dalam rentang (query dengan cursor tanpa buffer)"""
+    header = ['Tanggal', 'NIM', 'Nama', 'Jurusan', 'Tipe', 'Waktu', 'Confidence']
+    rows = (
+        [p['waktu'].strftime('%Y-%m-%d'), p['nim'], p['nama'], p['jurusan'], p['tipe'],
+         _time(p['waktu']), f"{p['confidence']:.2f}" if p['confidence'] else '-']
+        for p in presensi_rows(db, start, end, jurusan)
+    )
+    return 'Laporan Presensi', header, rows
+
+
+def _jurusan_report(db, start, end, jurusan):
+    """Rekap harian per jurusan dari tabel ringkasan presensi_harian"""
+    query = '''
+        SELECT tanggal, jurusan, masuk, keluar, mahasiswa_unik, first_in, last_out
+        FROM presensi_harian
+        WHERE tanggal >= %s AND tanggal < %s
+    '''
+    params = [start.date(), end.date()]
+    if jurusan:
+        query += " AND jurusan = %s"
+        params.append(jurusan)
+    query += " ORDER BY tanggal, jurusan"
+
+    header = ['Tanggal', 'Jurusan', 'Masuk', 'Keluar', 'Mahasiswa', 'Masuk Pertama', 'Keluar Terakhir']
+    rows = (
+        [str(r['tanggal']), r['jurusan'], r['masuk'], r['keluar'], r['mahasiswa_unik'],
+         _time(r['first_in']), _time(r['last_out'])]
+        for r in db.stream_query(query, tuple(params))
+    )
+    return 'Rekap Presensi per Jurusan', header, rows
+
+
+def _mahasiswa_report(db, start, end, jurusan):
+    """Rekap per mahasiswa: jumlah hari hadir, masuk/keluar, presensi pertama dan terakhir"""
+    query = '''
+        SELECT m.nim, m.nama, m.jurusan,
+               COUNT(DISTINCT DATE(p.waktu)) AS hari_hadir,
+               COALESCE(SUM(p.tipe = 'masuk'), 0) AS masuk,
+               COALESCE(SUM(p.tipe = 'keluar'), 0) AS keluar,
+               MIN(p.waktu) AS pertama, MAX(p.waktu) AS terakhir
+        FROM mahasiswa m
+        LEFT JOIN presensi p ON p.mahasiswa_id = m.id AND p.waktu >= %s AND p.waktu < %s
+    '''
+    params = [start, end]
+    if jurusan:
+        query += " WHERE m.jurusan = %s"
+        params.append(jurusan)
+    query += " GROUP BY m.id, m.nim, m.nama, m.jurusan ORDER BY m.jurusan, m.nama"
+
+    header = ['NIM', 'Nama', 'Jurusan', 'Hari Hadir', 'Masuk', 'Keluar', 'Pertama', 'Terakhir']
+    rows = (
+        [r['nim'], r['nama'], r['jurusan'], r['hari_hadir'], int(r['masuk']), int(r['keluar']),
+         r['pertama'].strftime('%Y-%m-%d %H:%M') if r['pertama'] else '-',
+         r['terakhir'].strftime('%Y-%m-%d %H:%M') if r['terakhir'] else '-']
+        for r in db.stream_query(query, tuple(params))
+    )
+    return 'Rekap Presensi per Mahasiswa', header, rows
+
+
+REPORT_TYPES = {
+    'detail': _detail_report,
+    'jurusan': _jurusan_report,
+    'mahasiswa': _mahasiswa_report,
+}
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _page_footer(canvas, doc):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 8)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Halaman {doc.page}")
+    canvas.drawString(doc.leftMargin, doc.bottomMargin / 2, doc.title)
+    canvas.restoreState()
+
+
+def period_label(start, end) -> str:
+    dari, sampai = start.date(), (end - timedelta(days=1)).date()
+    return str(dari) if dari == sampai else f"{dari} s/d {sampai}"
+
+
+def render_report(db, report_type, start, end, jurusan, output, rows_per_table=ROWS_PER_TABLE):
+    """Membuat laporan PDF untuk rentang [start, end) ke file/buffer output.
+
+    Semua baris disimpan sebagai flowable Table sebelum doc.build() melakukan
+    layout, jadi memori sebanding dengan jumlah baris; rentang besar
+    dirender di proses ReportJobs, bukan di worker web.
+    """
+    title, header, rows = REPORT_TYPES[report_type](db, start, end, jurusan)
+
+    periode = period_label(start, end)
+    doc = SimpleDocTemplate(output, pagesize=letter, title=f"{title} - {periode}")
+    styles = getSampleStyleSheet()
+    elements = [
+        Paragraph(f"{title} - {periode}", styles['Title']),
+        Paragraph(f"Jurusan: {jurusan or 'Semua'}", styles['Normal']),
+        Spacer(1, 12)
+    ]
+
+    # Data dipecah menjadi tabel-tabel seukuran halaman dengan header berulang
+    for chunk in _chunks(rows, rows_per_table):
+        table = Table([header] + chunk, repeatRows=1)
+        table.setStyle(TABLE_STYLE)
+        elements.append(table)
+
+    if len(elements) == 3:
+        elements.append(Paragraph("Tidak ada data presensi", styles['Normal']))
+
+    doc.build(elements, onFirstPage=_page_footer, onLaterPages=_page_footer)
+
+
+# Database milik proses renderer, dibuat sekali per proses
+_worker_db = None
+
+
+def _render_job(job, directory):
+    """Merender satu job di proses renderer dan mencatat statusnya di direktori bersama"""
+    global _worker_db
+    store = JobStore(directory)
+    store.write(job['id'], dict(job, status='running'))
+    try:
+        if _worker_db is None:
+            from database import Database
+            # Skema sudah disiapkan proses web; lewati DDL dan migrasi
+            _worker_db = Database(pool_size=1, init=False)
+        render_report(_worker_db, job['type'], datetime.fromisoformat(job['start']),
+                      datetime.fromisoformat(job['end']), job['jurusan'], store.path(job['id'], '.pdf'))
+    except Exception as e:
+        store.write(job['id'], dict(job, status='error', error=str(e)))
+        raise
+    store.write(job['id'], dict(job, status='done'))
+
+
+def report_filename(report_type, start, end, jurusan) -> str:
+    suffix = f"_{jurusan.replace(' ', '_')}" if jurusan else ''
+    dari, sampai = start.date(), (end - timedelta(days=1)).date()
+    label = dari if dari == sampai else f"{dari}_{sampai}"
+    return f"laporan_{report_type}_{label}{suffix}.pdf"
+
+
+class ReportJobs:
+    """Antrian render laporan PDF di proses terpisah agar tidak menahan worker web.
+
+    Status job (<id>.json) dan hasilnya (<id>.pdf) disimpan di direktori
+    bersama, sehingga status dan unduhan bisa dilayani worker WSGI mana pun.
+    File job dihapus setelah ttl detik.
+    """
+
+    def __init__(self, workers=2, ttl=3600, directory=None):
+        self.workers = workers
+        self.store = JobStore(directory or os.path.join(tempfile.gettempdir(), 'presensi_reports'), ttl=ttl)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def submit(self, report_type, start, end, jurusan=None) -> dict:
+        if report_type not in REPORT_TYPES:
+            raise ValueError(f"Jenis laporan tidak dikenal: {report_type}")
+
+        self.store.cleanup()
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'type': report_type,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'periode': period_label(start, end),
+            'jurusan': jurusan,
+            'filename': report_filename(report_type, start, end, jurusan),
+            'status': 'queued',
+            'error': None,
+            'created_at': time.time()
+        }
+        self.store.write(job['id'], job)
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            try:
+                future = self._executor.submit(_render_job, job, self.store.directory)
+            except BrokenProcessPool:
+                # Proses renderer mati (mis. OOM); pool lama tidak bisa dipakai lagi
+                print("Report renderer pool broken, restarting")
+                self._executor.shutdown(wait=False)
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                future = self._executor.submit(_render_job, job, self.store.directory)
+        future.add_done_callback(lambda f: self._finished(job, f))
+        return job
+
+    def _finished(self, job, future):
+        """Mencatat job yang gagal tanpa sempat dicatat renderer (dibatalkan atau proses mati)"""
+        if future.cancelled():
+            self.store.write(job['id'], dict(job, status='error', error='Dibatalkan'))
+        elif future.exception() is not None:
+            self.store.write(job['id'], dict(job, status='error', error=str(future.exception())))
+
+    def get(self, job_id):
+        """Status job dari direktori bersama, atau None bila tidak dikenal/kedaluwarsa"""
+        return self.store.read(job_id)
+
+    def path(self, job_id) -> str:
+        return self.store.path(job_id, '.pdf')
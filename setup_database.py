@@ -1,6 +1,8 @@
 import mysql.connector
 from mysql.connector import Error
 import bcrypt
+from attendance import SUMMARY_TABLE, rebuild_summary
+from database import ensure_column, ensure_index, migrate_face_encodings
 
 def setup_database():
     try:
@@ -39,7 +41,13 @@ def setup_database():
                     nama VARCHAR(100) NOT NULL,
                     jurusan VARCHAR(50) NOT NULL,
                     face_encoding LONGTEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                    face_encoding_bin VARBINARY(512),
+                    face_encoding_version TINYINT,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                    INDEX idx_mahasiswa_updated_at (updated_at),
+                    INDEX idx_mahasiswa_nama (nama),
+                    INDEX idx_mahasiswa_jurusan_nama (jurusan, nama)
                 )
                 """,
                 """
@@ -49,6 +57,8 @@ def setup_database():
                     waktu DATETIME DEFAULT CURRENT_TIMESTAMP,
                     tipe ENUM('masuk','keluar') NOT NULL,
                     confidence FLOAT,
+                    INDEX idx_presensi_waktu (waktu),
+                    INDEX idx_presensi_mahasiswa_waktu (mahasiswa_id, waktu),
                     FOREIGN KEY (mahasiswa_id) REFERENCES mahasiswa(id)
                 )
                 """,
@@ -60,12 +70,33 @@ def setup_database():
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
                     FOREIGN KEY (user_id) REFERENCES users(id)
                 )
-                """
+                """,
+                SUMMARY_TABLE
             ]
             
             for table in tables:
                 cursor.execute(table)
             
+            # Migrasi database lama: encoding JSON -> BLOB biner, index rentang tanggal
+            ensure_column(cursor, 'mahasiswa', 'face_encoding_bin', 'VARBINARY(512) AFTER face_encoding')
+            ensure_column(cursor, 'mahasiswa', 'face_encoding_version', 'TINYINT AFTER face_encoding_bin')
+            ensure_column(cursor, 'mahasiswa', 'updated_at',
+                          'DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP')
+            ensure_index(cursor, 'mahasiswa', 'idx_mahasiswa_updated_at', 'updated_at')
+            ensure_index(cursor, 'mahasiswa', 'idx_mahasiswa_nama', 'nama')
+            ensure_index(cursor, 'mahasiswa', 'idx_mahasiswa_jurusan_nama', 'jurusan, nama')
+            ensure_index(cursor, 'presensi', 'idx_presensi_waktu', 'waktu')
+            ensure_index(cursor, 'presensi', 'idx_presensi_mahasiswa_waktu', 'mahasiswa_id, waktu')
+            migrated = migrate_face_encodings(cursor)
+            if migrated:
+                print(f"{migrated} face encodings migrated to binary format")
+            
+            # Backfill ringkasan harian dari data presensi yang sudah ada
+            cursor.execute("SELECT COUNT(*) FROM presensi_harian")
+            if cursor.fetchone()[0] == 0:
+                rebuilt = rebuild_summary(cursor)
+                print(f"Daily summary rebuilt: {rebuilt} rows")
+            
             # Insert default admin user
             cursor.execute("SELECT COUNT(*) FROM users")
             if cursor.fetchone()[0] == 0:
@@ -0,0 +1,190 @@
+import json
+import struct
+import sys
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+from gallery import ENCODING_DIM, FaceGallery
+from snapshot import watermark_from_json, watermark_to_json
+
+# Segmen kontrol: generation galeri terbaru (0 = belum pernah dipublish)
+_CONTROL = struct.Struct('<Q')
+
+# Header segmen galeri: magic, format, jumlah wajah, panjang metadata JSON.
+# Setelah header: encodings float32 (N, 128), norma kuadrat float32 (N,), metadata.
+_HEADER = struct.Struct('<4sIQQ')
+_MAGIC = b'FGAL'
+_FORMAT = 1
+
+
+def _untrack(shm):
+    """Segmen dikelola sendiri; jangan dihapus resource_tracker saat proses ini berhenti"""
+    if sys.platform != 'win32':
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def _unlink_segment(name):
+    try:
+        shm = shared_memory.SharedMemory(name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _views(buf, size):
+    """View numpy encodings dan norma kuadrat di atas buffer segmen, plus offset metadata"""
+    offset = _HEADER.size
+    encodings = np.ndarray((size, ENCODING_DIM), dtype=np.float32, buffer=buf, offset=offset)
+    offset += encodings.nbytes
+    sq_norms = np.ndarray((size,), dtype=np.float32, buffer=buf, offset=offset)
+    return encodings, sq_norms, offset + sq_norms.nbytes
+
+
+class SharedGallery:
+    """Galeri wajah di shared memory yang dipakai bersama oleh semua proses worker.
+
+    Segmen kontrol kecil bernama `name` menyimpan generation terbaru. Publish
+    menulis galeri lengkap ke segmen baru `<name>_<generation>` lalu baru
+    menaikkan generation, sehingga pembaca tidak pernah melihat segmen yang
+    setengah jadi. Pembaca memetakan segmen read-only tanpa menyalin matriks;
+    memeriksa perubahan cukup dengan membaca 8 byte generation.
+    """
+
+    def __init__(self, name='presensi_gallery', keep=2):
+        self.name = name
+        self.keep = keep
+        self._control = None
+        self._segments = {}  # generation -> SharedMemory yang dipetakan proses ini
+
+    def _segment_name(self, generation) -> str:
+        return f"{self.name}_{generation}"
+
+    def _control_segment(self):
+        if self._control is None:
+            try:
+                control = shared_memory.SharedMemory(self.name)
+            except FileNotFoundError:
+                try:
+                    # Segmen baru berisi nol = generation 0
+                    control = shared_memory.SharedMemory(self.name, create=True, size=_CONTROL.size)
+                except FileExistsError:
+                    control = shared_memory.SharedMemory(self.name)
+            _untrack(control)
+            self._control = control
+        return self._control
+
+    @property
+    def generation(self) -> int:
+        return _CONTROL.unpack_from(self._control_segment().buf, 0)[0]
+
+    def _create_segment(self, generation, size):
+        name = self._segment_name(generation)
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Sisa proses yang berhenti di tengah publish
+            self._unlink(generation)
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        _untrack(shm)
+        return shm
+
+    def _unlink(self, generation):
+        _unlink_segment(self._segment_name(generation))
+
+    def _release_old(self, generation):
+        """Menutup pemetaan generation lama yang sudah tidak dipakai galeri mana pun"""
+        for old in [g for g in self._segments if g <= generation - self.keep]:
+            try:
+                self._segments[old].close()
+            except BufferError:
+                # Masih direferensikan galeri yang sedang dipakai; dicoba lagi nanti
+                continue
+            del self._segments[old]
+
+    def publish(self, gallery: FaceGallery, watermark=None) -> int:
+        """Menulis salinan galeri ke segmen baru dan menjadikannya generation terbaru.
+
+        Hanya satu proses yang boleh publish pada satu waktu (lihat
+        FaceRecognition.sync_from_db yang memakai lock database).
+        """
+        with gallery._lock:
+            size = len(gallery)
+            meta = json.dumps({'data': gallery.data, 'watermark': watermark_to_json(watermark)}).encode()
+            generation = self.generation + 1
+
+            total = _HEADER.size + size * (ENCODING_DIM + 1) * 4 + len(meta)
+            shm = self._create_segment(generation, total)
+            _HEADER.pack_into(shm.buf, 0, _MAGIC, _FORMAT, size, len(meta))
+            encodings, sq_norms, offset = _views(shm.buf, size)
+            encodings[:] = gallery.encodings
+            sq_norms[:] = gallery.sq_norms
+            shm.buf[offset:offset + len(meta)] = meta
+            del encodings, sq_norms
+
+        self._segments[generation] = shm
+        # Generation dinaikkan paling akhir, setelah segmen lengkap
+        _CONTROL.pack_into(self._control_segment().buf, 0, generation)
+
+        # Generation sebelumnya tetap ada untuk pembaca yang sedang memetakan
+        if generation > self.keep:
+            self._unlink(generation - self.keep)
+        self._release_old(generation)
+        return generation
+
+    def unlink(self):
+        """Menghapus semua segmen galeri ini; hanya untuk pemilik tunggal galeri (pool privat)"""
+        if self._control is None:
+            return
+        generation = self.generation
+        for old in range(max(1, generation - self.keep + 1), generation + 1):
+            self._unlink(old)
+        for shm in self._segments.values():
+            try:
+                shm.close()
+            except BufferError:
+                pass
+        self._segments = {}
+        self._control.close()
+        self._control = None
+        _unlink_segment(self.name)
+
+    def attach(self, index=None) -> Optional[Tuple[int, FaceGallery, Optional[dict]]]:
+        """Memetakan galeri generation terbaru tanpa menyalin encoding.
+
+        Mengembalikan (generation, gallery, watermark), atau None bila belum
+        ada galeri yang dipublish. Galeri yang dihasilkan baru menyalin
+        buffernya saat diubah (copy-on-write).
+        """
+        for _ in range(3):
+            generation = self.generation
+            if generation == 0:
+                return None
+
+            shm = self._segments.get(generation)
+            if shm is None:
+                try:
+                    shm = shared_memory.SharedMemory(self._segment_name(generation))
+                except FileNotFoundError:
+                    # Sudah digantikan publish yang lebih baru
+                    continue
+                _untrack(shm)
+
+            magic, fmt, size, meta_len = _HEADER.unpack_from(shm.buf, 0)
+            if magic != _MAGIC or fmt != _FORMAT:
+                raise ValueError(f"Unsupported shared gallery format in {shm.name}")
+
+            encodings, sq_norms, offset = _views(shm.buf, size)
+            encodings.flags.writeable = False
+            sq_norms.flags.writeable = False
+            meta = json.loads(bytes(shm.buf[offset:offset + meta_len]))
+
+            gallery = FaceGallery(encodings, meta['data'], index=index, sq_norms=sq_norms, copy=False)
+            self._segments[generation] = shm
+            self._release_old(generation)
+            return generation, gallery, watermark_from_json(meta['watermark'])
+
+        raise RuntimeError(f"Shared gallery {self.name} keeps changing, could not attach")
@@ -0,0 +1,104 @@
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+
+from gallery import ENCODING_DIM, FaceGallery
+
+# Format snapshot galeri di disk: beberapa file .npy plus meta.json.
+# meta.json ditulis paling akhir (os.replace) dan menunjuk file .npy yang
+# berlaku, sehingga snapshot yang setengah ditulis tidak pernah terbaca.
+SNAPSHOT_FORMAT = 1
+_META_FILE = 'meta.json'
+_ARRAYS = ('encodings', 'sq_norms', 'ids', 'nims', 'names')
+
+
+def watermark_to_json(watermark):
+    if watermark is None:
+        return None
+    last_update = watermark['last_update']
+    return dict(watermark, last_update=last_update.isoformat() if last_update else None)
+
+
+def watermark_from_json(watermark):
+    if watermark is None:
+        return None
+    last_update = watermark['last_update']
+    return dict(watermark, last_update=datetime.fromisoformat(last_update) if last_update else None)
+
+
+def save_snapshot(path, gallery: FaceGallery, watermark):
+    """Menulis galeri ke direktori snapshot beserta watermark database"""
+    os.makedirs(path, exist_ok=True)
+    token = uuid.uuid4().hex[:12]
+
+    with gallery._lock:
+        arrays = {
+            'encodings': np.ascontiguousarray(gallery.encodings, dtype=np.float32),
+            'sq_norms': np.ascontiguousarray(gallery.sq_norms, dtype=np.float32),
+            'ids': np.array([d['id'] for d in gallery.data], dtype=np.int64),
+            'nims': np.array([d['nim'] for d in gallery.data], dtype=np.str_),
+            'names': np.array([d['nama'] for d in gallery.data], dtype=np.str_),
+        }
+
+    files = {}
+    for key, array in arrays.items():
+        files[key] = f"{key}-{token}.npy"
+        np.save(os.path.join(path, files[key]), array)
+
+    meta = {
+        'format': SNAPSHOT_FORMAT,
+        'count': len(arrays['ids']),
+        'files': files,
+        'watermark': watermark_to_json(watermark),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+    }
+    meta_path = os.path.join(path, _META_FILE)
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_path + '.tmp', meta_path)
+
+    # File snapshot lama; di Windows file yang masih di-mmap gagal dihapus dan dicoba lagi lain kali
+    current = set(files.values())
+    for name in os.listdir(path):
+        if name.endswith('.npy') and name not in current:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+
+def load_snapshot(path, index=None) -> Optional[Tuple[FaceGallery, dict]]:
+    """Memetakan snapshot galeri (mmap, tanpa membaca seluruh file).
+
+    Mengembalikan (gallery, watermark) atau None bila snapshot tidak ada atau
+    tidak valid. Matriks encoding baru disalin saat galeri diubah.
+    """
+    meta_path = os.path.join(path, _META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('format') != SNAPSHOT_FORMAT:
+            print(f"Ignoring gallery snapshot with unsupported format {meta.get('format')}")
+            return None
+
+        arrays = {key: np.load(os.path.join(path, meta['files'][key]), mmap_mode='r') for key in _ARRAYS}
+    except (OSError, KeyError, ValueError) as e:
+        print(f"Gallery snapshot not loaded: {e}")
+        return None
+
+    encodings = arrays['encodings']
+    if encodings.shape != (meta['count'], ENCODING_DIM) or any(len(arrays[k]) != meta['count'] for k in _ARRAYS):
+        print("Ignoring gallery snapshot with inconsistent array sizes")
+        return None
+
+    data = [{'id': int(i), 'nim': str(nim), 'nama': str(nama)}
+            for i, nim, nama in zip(arrays['ids'].tolist(), arrays['nims'].tolist(), arrays['names'].tolist())]
+    gallery = FaceGallery(encodings, data, index=index, sq_norms=arrays['sq_norms'], copy=False)
+    return gallery, watermark_from_json(meta['watermark'])
@@ -0,0 +1,71 @@
+import os
+from typing import List, Tuple
+
+import pandas as pd
+
+REQUIRED_COLUMNS = ('nim', 'nama', 'jurusan')
+# Panjang maksimal sesuai definisi kolom tabel mahasiswa
+MAX_LENGTHS = {'nim': 20, 'nama': 100, 'jurusan': 50}
+
+_UPSERT_MAHASISWA = '''
+    INSERT INTO mahasiswa (nim, nama, jurusan) VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE nama = VALUES(nama), jurusan = VALUES(jurusan)
+'''
+
+
+def read_student_file(file, filename) -> pd.DataFrame:
+    """Membaca file CSV/XLSX mahasiswa; semua kolom dibaca sebagai teks agar NIM tidak berubah"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(file, dtype=str, keep_default_na=False)
+    if extension in ('.xlsx', '.xls'):
+        return pd.read_excel(file, dtype=str, keep_default_na=False)
+    raise ValueError('Format file harus CSV atau XLSX')
+
+
+def validate_students(df: pd.DataFrame) -> Tuple[List[tuple], List[str]]:
+    """Memvalidasi baris mahasiswa, mengembalikan (baris valid (nim, nama, jurusan), daftar error)"""
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    missing = [c for c in REQUIRED_COLUMNS if c not in df.columns]
+    if missing:
+        raise ValueError(f"Kolom wajib tidak ada: {', '.join(missing)}")
+
+    df = df[list(REQUIRED_COLUMNS)].apply(lambda column: column.str.strip())
+
+    rows = {}
+    errors = []
+    # Nomor baris sesuai file (baris 1 adalah header)
+    for line, nim, nama, jurusan in zip(df.index + 2, df['nim'], df['nama'], df['jurusan']):
+        values = {'nim': nim, 'nama': nama, 'jurusan': jurusan}
+        empty = [c for c in REQUIRED_COLUMNS if not values[c]]
+        if len(empty) == len(REQUIRED_COLUMNS):
+            continue
+        if empty:
+            errors.append(f"Baris {line}: {', '.join(empty)} kosong")
+            continue
+
+        too_long = [c for c in REQUIRED_COLUMNS if len(values[c]) > MAX_LENGTHS[c]]
+        if too_long:
+            errors.append(f"Baris {line}: {', '.join(too_long)} terlalu panjang")
+            continue
+
+        if nim in rows:
+            errors.append(f"Baris {line}: NIM {nim} duplikat, baris sebelumnya ditimpa")
+        rows[nim] = (nim, nama, jurusan)
+
+    return list(rows.values()), errors
+
+
+def import_students(db, rows, chunk_size=1000) -> Tuple[int, int]:
+    """Upsert mahasiswa dengan executemany per chunk (satu transaksi per chunk).
+
+    Mengembalikan (jumlah baru, jumlah diperbarui).
+    """
+    existing = {row['nim'] for row in db.execute_query("SELECT nim FROM mahasiswa") or []}
+    inserted = sum(1 for row in rows if row[0] not in existing)
+
+    for start in range(0, len(rows), chunk_size):
+        if db.execute_many(_UPSERT_MAHASISWA, rows[start:start + chunk_size]) is None:
+            raise RuntimeError(f"Gagal menyimpan baris {start + 1}-{start + chunk_size} ke database")
+
+    return inserted, len(rows) - inserted
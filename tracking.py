@@ -0,0 +1,96 @@
+from itertools import count
+from typing import List, Optional
+
+
+def box_iou(a, b) -> float:
+    """Intersection over union dua kotak (top, right, bottom, left)"""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(0, right - left) * max(0, bottom - top)
+    if intersection == 0:
+        return 0.0
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    return intersection / float(area_a + area_b - intersection)
+
+
+class Track:
+    """Satu wajah yang diikuti antar frame beserta identitas hasil pengenalan"""
+
+    _ids = count(1)
+
+    def __init__(self, location):
+        self.track_id = next(Track._ids)
+        self.location = location
+        self.identity: Optional[dict] = None
+        self.last_verified: Optional[int] = None
+        self.misses = 0
+
+
+class FaceTracker:
+    """Pelacak wajah berbasis IoU agar encoding hanya dijalankan untuk wajah baru.
+
+    Setiap frame, kotak deteksi dipasangkan dengan track yang ada berdasarkan
+    IoU tertinggi. Track yang sudah dikenali cukup memakai identitas yang
+    tersimpan, dan encoding diulang setiap `reverify_frames` frame untuk
+    verifikasi ulang.
+    """
+
+    def __init__(self, iou_threshold=0.3, reverify_frames=15, max_misses=5):
+        self.iou_threshold = iou_threshold
+        self.reverify_frames = reverify_frames
+        self.max_misses = max_misses
+        self.tracks: List[Track] = []
+        self.frame_index = 0
+
+    def update(self, locations) -> List[Track]:
+        """Memasangkan deteksi frame ini dengan track, mengembalikan track yang terlihat"""
+        self.frame_index += 1
+
+        # Greedy matching: pasangan dengan IoU tertinggi didahulukan
+        pairs = sorted(
+            ((box_iou(track.location, location), t, d)
+             for t, track in enumerate(self.tracks)
+             for d, location in enumerate(locations)),
+            reverse=True
+        )
+
+        matched_tracks, matched_detections = set(), set()
+        visible = [None] * len(locations)
+        for iou, t, d in pairs:
+            if iou < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_detections:
+                continue
+            track = self.tracks[t]
+            track.location = locations[d]
+            track.misses = 0
+            matched_tracks.add(t)
+            matched_detections.add(d)
+            visible[d] = track
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for d, location in enumerate(locations):
+            if visible[d] is None:
+                visible[d] = Track(location)
+                self.tracks.append(visible[d])
+
+        return visible
+
+    def needs_encoding(self, track: Track) -> bool:
+        """Track baru atau yang sudah waktunya diverifikasi ulang perlu di-encode"""
+        return track.last_verified is None or self.frame_index - track.last_verified >= self.reverify_frames
+
+    def bind(self, track: Track, identity: dict):
+        """Menyimpan hasil pengenalan pada track"""
+        track.identity = identity
+        track.last_verified = self.frame_index
+
+    def reset(self):
+        self.tracks = []
+        self.frame_index = 0
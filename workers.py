@@ -0,0 +1,97 @@
+import atexit
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import List, Optional
+
+from face_utils import FaceRecognition, decode_image
+from shared_gallery import SharedGallery
+
+# FaceRecognition milik proses worker, dibuat sekali oleh initializer
+_worker_recog: Optional[FaceRecognition] = None
+
+
+def _init_worker(shared_name):
+    """Initializer proses worker: memetakan galeri shared (generation terbaru diambil setiap mencocokkan)"""
+    global _worker_recog
+    _worker_recog = FaceRecognition()
+    _worker_recog.use_shared_gallery(SharedGallery(shared_name))
+
+
+def _recognize(payload: bytes) -> Optional[List[dict]]:
+    """Decode, deteksi, encode dan cocokkan satu frame JPEG di proses worker"""
+    frame = decode_image(payload)
+    if frame is None:
+        return None
+    return _worker_recog.recognize_faces(frame)
+
+
+class RecognitionPool:
+    """Pool proses untuk pengenalan wajah agar semua core CPU terpakai.
+
+    Deteksi HOG dan encoding dlib terikat CPU, sehingga dijalankan di proses
+    terpisah. Worker selalu memetakan galeri dari shared memory: galeri shared
+    aplikasi bila aktif, atau galeri shared privat milik pool yang dipublish
+    ulang dari galeri proses web saat berubah. Enrollment atau sync tidak
+    pernah membuat ulang proses worker.
+    """
+
+    def __init__(self, face_recog: FaceRecognition, workers: int):
+        self.face_recog = face_recog
+        self.workers = workers
+        self._executor = None
+        self._shared_name = None
+        # Galeri shared privat bila SHARED_GALLERY tidak aktif
+        self._private = None
+        self._published_key = None
+        self._lock = threading.Lock()
+        atexit.register(self.shutdown)
+
+    def _shared_gallery(self) -> SharedGallery:
+        if self.face_recog.shared is not None:
+            return self.face_recog.shared
+
+        if self._private is None:
+            self._private = SharedGallery(f"{self.face_recog.config.GALLERY_SHM_NAME}_pool_{os.getpid()}")
+
+        # Publish hanya bila galeri berubah sejak publish terakhir; worker mengambilnya sendiri
+        gallery = self.face_recog.gallery
+        key = (id(gallery), gallery.version)
+        if key != self._published_key:
+            self._private.publish(gallery, self.face_recog.watermark)
+            self._published_key = key
+        return self._private
+
+    def _current_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            shared = self._shared_gallery()
+            if self._executor is None or shared.name != self._shared_name:
+                old_executor = self._executor
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     initializer=_init_worker,
+                                                     initargs=(shared.name,))
+                self._shared_name = shared.name
+
+                # Pool lama selesai mengerjakan frame yang sudah dikirim lalu berhenti
+                if old_executor is not None:
+                    old_executor.shutdown(wait=False)
+            return self._executor
+
+    def submit(self, payload: bytes) -> Future:
+        """Mengirim satu frame JPEG ke worker; hasilnya Future berisi daftar wajah (None bila gambar tidak valid)"""
+        return self._current_executor().submit(_recognize, payload)
+
+    def warm_up(self):
+        """Menjalankan semua proses worker sebelum request pertama"""
+        executor = self._current_executor()
+        list(executor.map(_recognize, [b''] * self.workers))
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            if self._private is not None:
+                self._private.unlink()
+                self._private = None
+                self._published_key = None
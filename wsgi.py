@@ -0,0 +1,8 @@
+"""Entry point server WSGI multi-worker, mis. `gunicorn -w 4 wsgi:app`.
+
+Setiap proses worker memuat galeri dan pool pengenalannya sendiri saat
+import, jadi jangan pakai --preload (pool proses tidak bertahan setelah fork).
+"""
+from app import app, init_app
+
+init_app()